@@ -0,0 +1,66 @@
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+# heavy dependencies that a cold start of the pipeline CLI must not import
+DEFAULT_FORBIDDEN = ("gensim", "telethon", "openai", "pinecone", "nltk", "bm25s", "streamlit")
+
+
+def parse_args(args: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure cold import time of a module with python -X importtime.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--module", default="yadbil.run.pipeline", help="Module to import in a fresh interpreter.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters, the median is reported.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list.")
+    parser.add_argument("--max_ms", type=float, default=None, help="Exit with 1 if the median exceeds it.")
+    parser.add_argument("--forbid", nargs="*", default=list(DEFAULT_FORBIDDEN), help="Packages that must not load.")
+    return parser.parse_args(args)
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Module -> (self, cumulative) import time in microseconds, from one fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main(args: Optional[list[str]] = None) -> int:
+    parsed_args = parse_args(args)
+    runs: List[Dict[str, Tuple[int, int]]] = [import_times(parsed_args.module) for _ in range(parsed_args.repeats)]
+    totals_ms = [run[parsed_args.module][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals_ms)
+    print(f"import {parsed_args.module}: median {median_ms:.1f} ms, min {min(totals_ms):.1f} ms")
+
+    last = runs[-1]
+    print("\nslowest modules by cumulative time (last run):")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda x: -x[1][1])[: parsed_args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+
+    status = 0
+    loaded = sorted({name.split(".")[0] for name in last} & set(parsed_args.forbid))
+    if loaded:
+        print(f"\nforbidden packages imported: {loaded}")
+        status = 1
+    if parsed_args.max_ms is not None and median_ms > parsed_args.max_ms:
+        print(f"\nmedian {median_ms:.1f} ms exceeds the budget of {parsed_args.max_ms} ms")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
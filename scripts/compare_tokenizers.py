@@ -0,0 +1,65 @@
+import argparse
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import List, Optional
+
+from yadbil.data.processing.text.utils.tokenizer import (
+    TOKENIZERS,
+    NltkTokenizer,
+    Tokenizer,
+    conformance_report,
+)
+
+
+def parse_args(args: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Token diff of the tokenizers against nltk.word_tokenize and their throughput.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--input_path", type=Path, required=True, help="JSONL corpus, e.g. clean/all_channels.jsonl.")
+    parser.add_argument("--column", default="text_no_links", help="Column with the text.")
+    parser.add_argument("--limit", type=int, default=10_000, help="Max number of texts.")
+    parser.add_argument("--min_word_length", type=int, default=2)
+    parser.add_argument("--to_lower", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--repeats", type=int, default=3, help="Benchmark repeats, the best one is reported.")
+    return parser.parse_args(args)
+
+
+def load_texts(path: Path, column: str, limit: int, to_lower: bool) -> List[str]:
+    with open(path) as f:
+        texts = [json.loads(line)[column] or "" for line in islice(f, limit)]
+    return [text.lower() for text in texts] if to_lower else texts
+
+
+def tokens_per_second(tokenizer: Tokenizer, texts: List[str], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        n_tokens = sum(len(tokenizer(text)) for text in texts)
+        best = min(best, time.perf_counter() - t0)
+    return n_tokens / best if best else 0.0
+
+
+def main(args: Optional[list[str]] = None) -> None:
+    parsed_args = parse_args(args)
+    texts = load_texts(parsed_args.input_path, parsed_args.column, parsed_args.limit, parsed_args.to_lower)
+    reference = NltkTokenizer(parsed_args.min_word_length)
+    print(f"{len(texts)} texts from {parsed_args.input_path}")
+
+    for name, tokenizer_cls in TOKENIZERS.items():
+        tokenizer = tokenizer_cls(min_word_length=parsed_args.min_word_length)
+        print(f"\n[{name}] {tokens_per_second(tokenizer, texts, parsed_args.repeats):,.0f} tokens/sec")
+        if tokenizer_cls is NltkTokenizer:
+            continue
+        report = conformance_report(texts, tokenizer, reference)
+        print(f"  identical texts: {report['identical_texts']:.1%}")
+        print(f"  tokens: {report['tokens']} vs {report['reference_tokens']} (nltk)")
+        print(f"  precision: {report['precision']:.4f}, recall: {report['recall']:.4f}")
+        print(f"  top extra: {report['top_extra']}")
+        print(f"  top missing: {report['top_missing']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from yadbil.utils.columnar import ColumnarDataset, ColumnarWriter, columnar_to_jsonl, jsonl_to_columnar
+from yadbil.utils.data_handling import get_dict_field
+
+
+RECORDS = [
+    {"id": 1, "text": "a", "processed_text": {"w": ["a"], "s": ["a"]}, "opt": None},
+    {"id": 2, "text": "b", "processed_text": {"w": ["b"]}},
+    {"id": 99, "extra": {"nested": [1, 2]}},
+    {"id": 3, "text": None, "processed_text": {}, "opt": 5},
+    {},
+]
+
+
+@pytest.fixture
+def jsonl_path(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in RECORDS))
+    return path
+
+
+def read_jsonl(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_mixed_schema_round_trip_keeps_absent_keys_absent(jsonl_path, tmp_path):
+    dataset = jsonl_to_columnar(jsonl_path, tmp_path / "data.cols")
+    columnar_to_jsonl(dataset.path, tmp_path / "back.jsonl")
+
+    assert read_jsonl(tmp_path / "back.jsonl") == RECORDS
+    assert list(dataset.iter_records()) == RECORDS
+    assert dataset.records() == RECORDS
+    assert dataset.records(["id", "opt"]) == [{"id": 1, "opt": None}, {"id": 2}, {"id": 99}, {"id": 3, "opt": 5}, {}]
+    # explicit null and missing key stay different downstream
+    with pytest.raises(KeyError):
+        get_dict_field(dataset.records()[1], ["opt"])
+    assert get_dict_field(dataset.records()[0], ["opt"]) is None
+
+
+def test_masks_survive_flushes_late_columns_and_take(tmp_path):
+    path = tmp_path / "data.cols"
+    with ColumnarWriter(path, flush_every=2) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    dataset = ColumnarDataset(path)
+    assert dataset.records() == RECORDS
+
+    taken = dataset.take([4, 2, 0], tmp_path / "taken.cols")
+    assert taken.records() == [RECORDS[4], RECORDS[2], RECORDS[0]]
+
+
+def test_new_columns_extend_base_dataset(jsonl_path, tmp_path):
+    base = jsonl_to_columnar(jsonl_path, tmp_path / "base.cols")
+    with ColumnarWriter(tmp_path / "extended.cols", base=base.path) as writer:
+        for i in range(len(RECORDS)):
+            writer.write({"new": i} if i % 2 else {})
+
+    expected = [{**record, **({"new": i} if i % 2 else {})} for i, record in enumerate(RECORDS)]
+    assert ColumnarDataset(tmp_path / "extended.cols").records() == expected
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+import openai
+import pytest
+
+from yadbil.search import embedding_runner
+from yadbil.search.embedding_runner import AsyncEmbeddingRunner, RateLimiter, TokenBucket, pack_batches
+
+
+class FakeEmbeddingsServer(ThreadingHTTPServer):
+    """Local /v1/embeddings endpoint, the embedding of "text {i}" is [i, 1]."""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FakeEmbeddingsHandler)
+        self.delay = delay
+        # (status, headers) returned instead of embeddings to the next requests
+        self.failures = []
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+        with server.lock:
+            failure = server.failures.pop(0) if server.failures else None
+            server.requests.append((time.monotonic(), texts[0], failure[0] if failure else 200))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if failure is not None:
+                status, headers = failure
+                self._send(status, {"error": {"message": f"fake {status}", "type": "fake"}}, headers)
+                return
+            data = [
+                {"object": "embedding", "index": i, "embedding": [float(text.split()[1]), 1.0]}
+                for i, text in enumerate(texts)
+            ]
+            # reversed on purpose, the runner must order items by index
+            body = {
+                "object": "list",
+                "data": data[::-1],
+                "model": "fake",
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }
+            self._send(200, body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def server():
+    server = FakeEmbeddingsServer(delay=0.02)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_runner(server: FakeEmbeddingsServer, **kwargs) -> AsyncEmbeddingRunner:
+    params = {"rpm": None, "tpm": None, "max_batch_size": 4, "initial_delay": 0.01, "max_delay": 0.05}
+    return AsyncEmbeddingRunner(api_key="test", base_url=server.base_url, **{**params, **kwargs})
+
+
+def texts(n: int) -> list:
+    return [f"text {i}" for i in range(n)]
+
+
+def test_output_order_is_preserved(server):
+    embeddings = make_runner(server, max_in_flight=8).run(texts(50))
+
+    assert embeddings.shape == (50, 2)
+    np.testing.assert_array_equal(embeddings[:, 0], np.arange(50))
+    assert len(server.requests) == 13
+
+
+def test_rate_limit_and_server_errors_are_retried(server):
+    server.failures = [(429, {"retry-after": "0.2"}), (500, {}), (503, {})]
+    embeddings = make_runner(server, max_batch_size=100).run(texts(10))
+
+    np.testing.assert_array_equal(embeddings[:, 0], np.arange(10))
+    statuses = [status for _, _, status in server.requests]
+    assert statuses == [429, 500, 503, 200]
+    # retry-after of the 429 response is respected before the next attempt
+    assert server.requests[1][0] - server.requests[0][0] >= 0.2
+
+
+def test_retries_are_limited(server):
+    server.failures = [(500, {})] * 3
+    with pytest.raises(openai.InternalServerError):
+        make_runner(server, max_batch_size=100, retries=2).run(texts(10))
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried(server):
+    server.failures = [(400, {})]
+    with pytest.raises(openai.BadRequestError):
+        make_runner(server, max_batch_size=100).run(texts(10))
+    assert len(server.requests) == 1
+
+
+def test_backoff_is_exponential_with_jitter(server):
+    runner = make_runner(server, initial_delay=1.0, max_delay=8.0)
+    error = openai.APIConnectionError(request=None)
+    for attempt in range(6):
+        ceiling = min(8.0, 2.0**attempt)
+        delays = [runner._retry_delay(error, attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+def test_concurrency_cap_holds(server):
+    server.delay = 0.05
+    make_runner(server, max_in_flight=3, max_batch_size=1).run(texts(24))
+
+    assert len(server.requests) == 24
+    assert server.max_in_flight == 3
+
+
+@pytest.mark.parametrize(
+    "token_counts, max_batch_tokens, max_batch_size",
+    [([1] * 10, 100, 3), ([5, 5, 5, 5], 10, 10), ([3, 50, 2, 2], 10, 10), ([], 10, 10)],
+)
+def test_pack_batches(token_counts, max_batch_tokens, max_batch_size):
+    batches = pack_batches(token_counts, max_batch_tokens, max_batch_size)
+
+    # consecutive ranges covering every text
+    bounds = [0] + [end for _, end in batches]
+    assert [start for start, _ in batches] == bounds[:-1]
+    assert bounds[-1] == len(token_counts)
+    for start, end in batches:
+        assert end - start <= max_batch_size
+        # a text over the limit is alone in its batch
+        assert sum(token_counts[start:end]) <= max_batch_tokens or end - start == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_runner, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(embedding_runner, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=clock.sleep))
+    return clock
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(30) == 0
+    # never more than a minute of units
+    clock.now += 600
+    assert bucket.wait_time(61) == 0 and bucket.available == 60
+
+
+@pytest.mark.parametrize("rpm, tpm, n_tokens", [(120, None, 1), (None, 6000, 100), (600, 3000, 50)])
+def test_rate_limiter_meets_limits(clock, rpm, tpm, n_tokens):
+    async def run():
+        limiter = RateLimiter(rpm, tpm)
+        times = []
+        for _ in range(300):
+            await limiter.acquire(n_tokens)
+            times.append(clock.now)
+        return np.array(times)
+
+    times = asyncio.run(run())
+    # at any time the bucket capacity (a minute of the limit) plus the refill since the start
+    for limit, per_request in ((rpm, 1), (tpm, n_tokens)):
+        if limit is None:
+            continue
+        used = np.arange(1, len(times) + 1) * per_request
+        assert np.all(used <= limit + times * limit / 60 + 1e-6)
+    # and the limiter does not wait longer than needed
+    requests_limit = min(limit / per_request for limit, per_request in ((rpm, 1), (tpm, n_tokens)) if limit)
+    assert times[-1] == pytest.approx((len(times) - requests_limit) * 60 / requests_limit)
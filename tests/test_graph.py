@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from yadbil.data.processing.text.idf import calculate_idf, calculate_idf_from_token_ids
+from yadbil.data.processing.text.utils.vocab import TokenIds, Vocab
+from yadbil.recsys.graph import GraphProcessor
+
+
+@pytest.fixture
+def posts() -> list:
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(40)]
+    # unsorted words with repeats, as stored by TextProcessor
+    return [
+        {"id": i, "stemmed_words": [words[j] for j in rng.integers(0, len(words), size=rng.integers(1, 15))]}
+        for i in range(300)
+    ]
+
+
+def test_token_ids_graph_matches_words_graph_and_keeps_inputs(posts):
+    vocab = Vocab()
+    token_ids = TokenIds.from_lists([vocab.encode(post["stemmed_words"]) for post in posts])
+    ids, indptr = token_ids.ids.copy(), token_ids.indptr.copy()
+    idf = calculate_idf_from_token_ids(token_ids, vocab)
+
+    G = GraphProcessor(posts, idf, token_ids=token_ids, vocab=vocab, max_df=200).G
+
+    # the caller's arrays are reused by later steps and must stay untouched
+    np.testing.assert_array_equal(token_ids.ids, ids)
+    np.testing.assert_array_equal(token_ids.indptr, indptr)
+    assert calculate_idf_from_token_ids(token_ids, vocab) == idf
+
+    expected = GraphProcessor(posts, calculate_idf(posts), max_df=200).G
+    assert set(G.nodes) == set(expected.nodes)
+    assert {frozenset(edge) for edge in G.edges} == {frozenset(edge) for edge in expected.edges}
+    for u, v, weight in expected.edges(data="weight"):
+        assert G[u][v]["weight"] == pytest.approx(weight)
@@ -0,0 +1,49 @@
+import json
+
+import networkx as nx
+import pytest
+
+from yadbil.recsys.graph import PageRankRecommender, convert_graphml_to_binary, load_graph_binary, save_graph_binary
+from yadbil.recsys.graph.io import read_graphml
+
+
+@pytest.fixture
+def graph() -> nx.Graph:
+    # int post ids as built by GraphProcessor
+    G = nx.Graph()
+    for i in range(30):
+        G.add_node(i, words=[f"w{i % 7}", f"w{i % 5}"])
+    for i in range(30):
+        for j in (i + 1, i + 3, i * 2 + 1):
+            if j < 30 and i != j:
+                G.add_edge(i, j, weight=1.0 + (i * j) % 4)
+    return G
+
+
+def write_graphml(G: nx.Graph, path) -> None:
+    H = G.copy()
+    for _, attrs in H.nodes(data=True):
+        attrs["words"] = json.dumps(attrs["words"])
+    nx.write_graphml(H, path)
+
+
+@pytest.mark.parametrize("from_graphml", [True, False])
+def test_binary_graph_recommends_like_graphml(graph, tmp_path, from_graphml):
+    graphml_path = tmp_path / "graph.graphml"
+    write_graphml(graph, graphml_path)
+    if from_graphml:
+        convert_graphml_to_binary(graphml_path, tmp_path / "binary")
+    else:
+        save_graph_binary(graph, tmp_path / "binary")
+
+    expected = PageRankRecommender(read_graphml(graphml_path))
+    binary = load_graph_binary(tmp_path / "binary")
+    recommender = PageRankRecommender(binary)
+
+    assert all(isinstance(node, str) for node in binary.nodes)
+    for post_id in graph:
+        # the UI looks posts up by str id
+        result = recommender.recommend(str(post_id), 5)
+        assert result
+        assert [node for node, _ in result] == [node for node, _ in expected.recommend(str(post_id), 5)]
+    assert binary.words(binary.nodes.index("3")) == graph.nodes[3]["words"]
@@ -1,4 +1,8 @@
-from yadbil.data.filtering.filter import DataFilter
+from yadbil.utils.lazy import lazy_getattr
 
 
-FILTER_STEPS = [DataFilter]
+__getattr__ = lazy_getattr(
+    __name__,
+    attrs={"DataFilter": "yadbil.data.filtering.filter"},
+    groups={"FILTER_STEPS": ["DataFilter"]},
+)
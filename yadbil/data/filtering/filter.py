@@ -4,7 +4,9 @@ from typing import Any, Dict, List, Union
 
 from tqdm.auto import tqdm
 
-from yadbil.utils.data_handling import get_dict_field
+from yadbil.data.processing.text.utils.vocab import take_token_ids
+from yadbil.utils.columnar import ColumnarDataset, is_columnar
+from yadbil.utils.data_handling import get_dict_field, read_records
 from yadbil.utils.logger import get_logger
 
 
@@ -68,25 +70,39 @@ class DataFilter:
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
         counter_filtered = 0
         counter = 0
+        kept_rows = []
 
         if data is None:
             if self.input_path is None:
                 raise ValueError("No input data provided.")
 
-        with open(self.input_path) as in_file:
-            with open(self.output_path, "w") as out_file:
-                for line in tqdm(in_file, desc="Filtering data"):
-                    item = json.loads(line)
-                    counter += 1
-                    if self.apply_filters(item):
-                        counter_filtered += 1
-                        out_file.write(line)
-                        # out_file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if is_columnar(self.input_path):
+            # only the filtered fields are read, kept rows of all columns are copied as bytes
+            records = read_records(self.input_path, columns=[f["keys"] for f in self.filters])
+            kept_rows = [i for i, item in enumerate(tqdm(records, desc="Filtering data")) if self.apply_filters(item)]
+            ColumnarDataset(self.input_path).take(kept_rows, self.output_path)
+            counter, counter_filtered = len(records), len(kept_rows)
+        else:
+            with open(self.input_path) as in_file:
+                with open(self.output_path, "w") as out_file:
+                    for line in tqdm(in_file, desc="Filtering data"):
+                        item = json.loads(line)
+                        counter += 1
+                        if self.apply_filters(item):
+                            kept_rows.append(counter - 1)
+                            counter_filtered += 1
+                            out_file.write(line)
+                            # out_file.write(json.dumps(item, ensure_ascii=False) + "\n")
 
         logger.info(f"Total number of records: {counter}")
         logger.info(f"Final number of records: {counter_filtered}")
         logger.info(f"Ratio of retained records: {round(counter_filtered / counter, 2)}")
 
+        # token ids of TextProcessor (token_ids_fields) must stay aligned with the records
+        fields = take_token_ids(self.input_path, self.output_path, kept_rows)
+        if fields:
+            logger.info(f"Filtered token ids of {fields}")
+
 
 if __name__ == "__main__":
     from yadbil.pipeline.config import PipelineConfig
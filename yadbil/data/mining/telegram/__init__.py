@@ -1,15 +1,23 @@
-from yadbil.data.mining.telegram.channels_info import (
-    TelegramChannelInfoParser,
-    TelegramChannelInfoParserSync,
-)
-from yadbil.data.mining.telegram.processing import TelegramDataProcessor
-from yadbil.data.mining.telegram.scraping import TelegramScraper, TelegramScraperSync
+from yadbil.utils.lazy import lazy_getattr
 
 
-TELEGRAM_STEPS = [
-    TelegramScraper,
-    TelegramChannelInfoParser,
-    TelegramDataProcessor,
-    TelegramChannelInfoParserSync,
-    TelegramScraperSync,
-]
+# telethon is imported only with the scraping steps
+__getattr__ = lazy_getattr(
+    __name__,
+    attrs={
+        "TelegramChannelInfoParser": "yadbil.data.mining.telegram.channels_info",
+        "TelegramChannelInfoParserSync": "yadbil.data.mining.telegram.channels_info",
+        "TelegramDataProcessor": "yadbil.data.mining.telegram.processing",
+        "TelegramScraper": "yadbil.data.mining.telegram.scraping",
+        "TelegramScraperSync": "yadbil.data.mining.telegram.scraping",
+    },
+    groups={
+        "TELEGRAM_STEPS": [
+            "TelegramScraper",
+            "TelegramChannelInfoParser",
+            "TelegramDataProcessor",
+            "TelegramChannelInfoParserSync",
+            "TelegramScraperSync",
+        ],
+    },
+)
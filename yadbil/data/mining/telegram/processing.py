@@ -1,10 +1,16 @@
 import json
+import os
+import shutil
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from tqdm import tqdm
 
+from yadbil.data.mining.telegram.utils.io import channel_name_from_path, open_jsonl
+from yadbil.data.processing.text.utils.spans import substitute_utf16_spans
+from yadbil.utils.columnar import COLUMNAR_SUFFIX, jsonl_to_columnar
 from yadbil.utils.logger import get_logger
 
 
@@ -17,11 +23,27 @@ class TelegramDataProcessor:
         input_dir: Path,
         output_dir: Path,
         channels_info_dir: Path,
+        n_workers: int = 1,
+        output_format: str = "jsonl",
     ):
+        """
+        Args:
+            n_workers (int): Number of processes, every channel file is processed by one of them.
+                Memory stays flat: records are streamed to the per-channel files
+                and all_channels.jsonl is concatenated from them afterwards.
+            output_format (str): "jsonl" or "columnar", the latter converts the combined file
+                into the all_channels.cols directory (see yadbil/utils/columnar.py).
+        """
         channels_info_dir = Path(channels_info_dir) if isinstance(channels_info_dir, str) else channels_info_dir
         self.channels_info_path = channels_info_dir / "channels_meta.json"
         self.output_dir = Path(output_dir) if isinstance(output_dir, str) else output_dir
         self.input_dir = Path(input_dir) if isinstance(input_dir, str) else input_dir
+        self.n_workers = n_workers
+        if output_format not in ("jsonl", "columnar"):
+            raise ValueError(f"Unknown output_format: {output_format}. Use 'jsonl' or 'columnar'.")
+        self.output_format = output_format
+        self.channels_id_to_name: Optional[Dict[int, str]] = None
+        self.channels_name_to_id: Optional[Dict[str, int]] = None
 
     def _id_to_name_and_name_to_id(self, path: Path) -> Tuple[Dict[int, str], Dict[str, int]]:
         with open(path) as file:
@@ -29,14 +51,12 @@ class TelegramDataProcessor:
         return {x["id"]: x["username"] for x in channels_meta}, {x["username"]: x["id"] for x in channels_meta}
 
     def sub_urls(self, data):
-        text = data["message"]
-        urls_to_replace = [
-            ent["entity"]["extracted_text"] for ent in data["entities"] if ent["entity"]["type"] == "MessageEntityUrl"
+        spans = [
+            (ent["entity"]["pos"]["utf-16-le"]["start"], ent["entity"]["pos"]["utf-16-le"]["end"])
+            for ent in data["entities"]
+            if ent["entity"]["type"] == "MessageEntityUrl"
         ]
-        urls_to_replace = sorted(urls_to_replace, key=len, reverse=True)
-        for url in urls_to_replace:
-            text = text.replace(url, " ")
-        return text.strip()
+        return substitute_utf16_spans(data["message"], spans, " ").strip()
 
     def process_reactions(self, reactions):
         rs = defaultdict(int)
@@ -74,37 +94,103 @@ class TelegramDataProcessor:
             "reactions": (self.process_reactions(data["reactions"]) if data["reactions"] else None),
         }
 
-    def run(self):
-        logger.info("Loading channels info")
-        self.channels_id_to_name, self.channels_name_to_id = self._id_to_name_and_name_to_id(self.channels_info_path)
-
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-
-        results = []
-        for chl in tqdm(list(self.input_dir.glob("*")), desc="Processing channels"):
-            with open(chl) as file:
-                (self.output_dir / "channels").mkdir(exist_ok=True, parents=True)
-                with open(self.output_dir / "channels" / chl.name, "w") as file_out:
-                    for line in tqdm(file):
+    def _channel_files(self) -> Dict[str, List[Path]]:
+        """Input files grouped by channel, a channel has several parts if compression changed between scrapes."""
+        files = defaultdict(list)
+        for path in sorted(self.input_dir.glob("*.jsonl*")):
+            files[channel_name_from_path(path)].append(path)
+        return dict(files)
+
+    def process_channel_file(self, paths: Sequence[Path]) -> Tuple[str, int, int]:
+        """Stream scraped files of one channel into output_dir/channels, returns (channel, read, kept).
+
+        Parts are read in the given order, repeated message ids are skipped, e.g. messages saved
+        again by a restarted scrape or present in two parts after a compression change.
+        """
+        channel = channel_name_from_path(paths[0])
+        out_path = self.output_dir / "channels" / f"{channel}.jsonl"
+        read, kept = 0, 0
+        seen_ids = set()
+        with open(out_path, "w", encoding="utf-8") as file_out:
+            for path in paths:
+                # plain, gzip or zstd scraper output
+                with open_jsonl(path) as file:
+                    for line in file:
                         line = json.loads(line)
+                        if line["id"] in seen_ids:
+                            continue
+                        seen_ids.add(line["id"])
+                        read += 1
                         if self.keep_or_not(line):
                             try:
-                                res = self.process_record(line, chl.stem)
-                                results.append(res)
-                                file_out.write(json.dumps(res, ensure_ascii=False))
-                                file_out.write("\n")
+                                res = self.process_record(line, channel)
                             except Exception as e:
                                 logger.error(e)
                                 logger.info(line)
                                 raise e
+                            file_out.write(json.dumps(res, ensure_ascii=False))
+                            file_out.write("\n")
+                            kept += 1
+        return channel, read, kept
+
+    def _concat_shards(self, channels) -> None:
+        out_path = self.output_dir / "all_channels.jsonl"
+        tmp_path = out_path.with_name(f".{out_path.name}.tmp")
+        with open(tmp_path, "wb") as file_out:
+            for channel in channels:
+                with open(self.output_dir / "channels" / f"{channel}.jsonl", "rb") as file:
+                    shutil.copyfileobj(file, file_out, length=1024 * 1024)
+        os.replace(tmp_path, out_path)
+
+    def run(self):
+        logger.info("Loading channels info")
+        self.channels_id_to_name, self.channels_name_to_id = self._id_to_name_and_name_to_id(self.channels_info_path)
+
+        (self.output_dir / "channels").mkdir(exist_ok=True, parents=True)
+
+        channel_files = self._channel_files()
+        for channel, paths in channel_files.items():
+            if len(paths) > 1:
+                logger.warning(f"{channel} is split into {[path.name for path in paths]}, reading all of them")
+        files = list(channel_files.values())
+        if self.n_workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                initializer=_init_worker,
+                initargs=(self,),
+            ) as executor:
+                stats = list(
+                    tqdm(executor.map(_process_channel_file, files), total=len(files), desc="Processing channels")
+                )
+        else:
+            stats = [self.process_channel_file(paths) for paths in tqdm(files, desc="Processing channels")]
+
+        for channel, read, kept in stats:
+            logger.info(f"{channel}: kept {kept} of {read} messages")
         logger.info("Finished processing")
         logger.info(f"Saving all_channels.jsonl at {self.output_dir}")
-        with open(self.output_dir / "all_channels.jsonl", "w") as file:
-            for result in results:
-                file.write(json.dumps(result, ensure_ascii=False))
-                file.write("\n")
+        # input order, so the combined file does not depend on the number of workers
+        self._concat_shards([channel for channel, _, _ in stats])
         logger.info("Saved all_channels.jsonl")
 
+        if self.output_format == "columnar":
+            jsonl_path = self.output_dir / "all_channels.jsonl"
+            jsonl_to_columnar(jsonl_path, self.output_dir / f"all_channels{COLUMNAR_SUFFIX}")
+            jsonl_path.unlink()
+
+
+# per-process copy of the processor with loaded channels info, set by the pool initializer
+_worker_processor: Optional[TelegramDataProcessor] = None
+
+
+def _init_worker(processor: TelegramDataProcessor) -> None:
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _process_channel_file(paths: Sequence[Path]) -> Tuple[str, int, int]:
+    return _worker_processor.process_channel_file(paths)
+
 
 if __name__ == "__main__":
     from yadbil.pipeline.config import PipelineConfig
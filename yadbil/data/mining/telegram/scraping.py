@@ -1,16 +1,23 @@
 import asyncio
+import random
 import time
+from contextlib import AsyncExitStack
+from functools import partial
 from pathlib import Path
+from typing import Dict
 
+from telethon.errors import FloodWaitError
 from tqdm import tqdm
 
 from yadbil.data.mining.telegram.utils.base import TelegramAsync
-from yadbil.data.mining.telegram.utils.io import save_messages_to_file
+from yadbil.data.mining.telegram.utils.io import AsyncChannelWriter, ChannelWriter, channel_file_path
 from yadbil.data.mining.telegram.utils.message_processing import MessageProcessor
+from yadbil.data.mining.telegram.utils.state import ScrapeState
 from yadbil.data.mining.telegram.utils.telegram_client import (
     TelegramMessageFetcher,
     TelegramMessageFetcherSync,
 )
+from yadbil.data.mining.telegram.utils.throttle import ChannelMetrics, FairSlots, FloodWaitController
 from yadbil.utils.logger import get_logger
 
 
@@ -26,51 +33,147 @@ class TelegramScraper(TelegramAsync):
         save_to_disk=True,
         batch_size=100,
         retry_limit=3,
+        max_flood_waits=10,
+        incremental=True,
+        state_path=None,
+        max_concurrency=4,
+        fair_share=2000,
+        iter_params=None,
+        flood_sleep_threshold=0,
+        compression=None,
+        max_pending_batches=16,
     ):
+        """
+        Args:
+            max_flood_waits (int): FloodWaits a channel may hit before it is given up,
+                counted apart from retry_limit because they are not failures.
+            incremental (bool): Keep per-channel watermarks and fetch only messages that are not saved yet.
+                Only used with save_to_disk.
+            state_path (Union[str, Path]): Watermarks file, defaults to _scrape_state.json in output_dir.
+            max_concurrency (int): Max number of channels fetched at the same time.
+            fair_share (int): Messages a channel fetches before giving its slot to a waiting channel,
+                so small channels are not stuck behind huge backfills. 0 disables it.
+            iter_params (dict): Extra iter_messages arguments, e.g. wait_time between chunk requests.
+            flood_sleep_threshold (int): FloodWaits up to this many seconds are slept by telethon inside one task,
+                0 routes all of them to the controller that pauses every channel.
+            compression (str): None, 'gzip' or 'zstd' compression of the output files.
+            max_pending_batches (int): Max number of batches queued for the writer before fetching waits.
+        """
         self.creds = creds
         self.channels = channels or []
         self.save_to_disk = save_to_disk
         self.batch_size = batch_size
         self.output_dir = Path(output_dir) if isinstance(output_dir, str) else output_dir
         self.retry_limit = retry_limit
+        self.max_flood_waits = max_flood_waits
+        self.state = None
+        if incremental and save_to_disk:
+            self.state = ScrapeState(state_path or self.output_dir / "_scrape_state.json")
+        self.max_concurrency = max_concurrency
+        self.fair_share = fair_share
+        self.iter_params = iter_params or {}
+        self.flood_sleep_threshold = flood_sleep_threshold
+        self.compression = compression
+        self.max_pending_batches = max_pending_batches
+        self.metrics: Dict[str, ChannelMetrics] = {}
+        # without watermarks a retried channel continues below the oldest message saved in this run
+        self._resume_ids: Dict[str, int] = {}
+        # created inside the running loop
+        self._slots = None
+        self._flood = None
+        self._writer = None
+
+    def _fetch_passes(self, channel: str) -> list:
+        if self.state is None:
+            offset_id = self._resume_ids.get(channel)
+            return [("backfill", {"offset_id": offset_id} if offset_id else {})]
+        self.state.bootstrap(channel, channel_file_path(channel, self.output_dir, self.compression))
+        return self.state.passes(channel)
+
+    async def _save_batch(self, channel: str, message_batch: list) -> None:
+        batch = list(message_batch)
+        if self.state is None:
+            # queued batches are written before the writer closes, a retry must not fetch them again
+            # the only pass is a backfill from new to old messages, every batch is older than the previous one
+            self._resume_ids[channel] = min(message["id"] for message in batch)
+        # watermarks move only after the writer task has written the batch
+        on_written = partial(self.state.advance, channel, batch) if self.state is not None else None
+        await self._writer.write(channel, batch, on_written)
 
     async def process_channel(self, parser: TelegramMessageFetcher, channel: str) -> dict:
+        """Fetch the channel holding one concurrency slot, errors are logged and re-raised for retries."""
+        metrics = self.metrics.setdefault(channel, ChannelMetrics())
+        t0 = time.perf_counter()
         try:
-            message_batch = []
             message_count = 0
+            slot_count = 0
             pbar = tqdm(desc=f"Processing {channel}", unit=" messages")
 
-            async for message in parser.iter_channel_messages(channel):
-                processed_message = MessageProcessor(message).process()
-                message_batch.append(processed_message)
-                message_count += 1
-                pbar.update(1)
+            for pass_name, fetch_kwargs in self._fetch_passes(channel):
+                message_batch = []
+                async for message in parser.iter_channel_messages(channel, **fetch_kwargs, **self.iter_params):
+                    processed_message = MessageProcessor(message).process()
+                    message_batch.append(processed_message)
+                    message_count += 1
+                    slot_count += 1
+                    pbar.update(1)
 
-                if self.save_to_disk and len(message_batch) >= self.batch_size:
-                    await save_messages_to_file(channel, message_batch, self.output_dir)
-                    message_batch.clear()
+                    if self.save_to_disk and len(message_batch) >= self.batch_size:
+                        await self._save_batch(channel, message_batch)
+                        message_batch.clear()
+                        if self.fair_share and slot_count >= self.fair_share and self._slots.has_waiters():
+                            await self._slots.yield_slot()
+                            slot_count = 0
+                    await self._flood.wait()
 
-            # Save any remaining messages
-            if self.save_to_disk and message_batch:
-                await save_messages_to_file(channel, message_batch, self.output_dir)
+                # Save any remaining messages
+                if self.save_to_disk and message_batch:
+                    await self._save_batch(channel, message_batch)
+                if pass_name == "backfill" and self.state is not None:
+                    await self._writer.after_pending(partial(self.state.complete, channel))
 
             pbar.close()
             logger.info(f"Processed {message_count} messages from {channel}")
             logger.info(f"Output folder: {self.output_dir / channel}")
         except Exception as e:
             logger.error(f"Error processing messages from channel {channel}: {str(e)}")
+            raise
+        finally:
+            metrics.messages += message_count
+            metrics.seconds += time.perf_counter() - t0
 
     async def retry_process_channel(self, parser: TelegramMessageFetcher, channel: str) -> dict:
         retries = 0
+        flood_waits = 0
         while retries < self.retry_limit:
+            await self._flood.wait()
             try:
-                return await self.process_channel(parser, channel)
+                # the slot is released while backing off
+                async with self._slots:
+                    return await self.process_channel(parser, channel)
+            except FloodWaitError as e:
+                # not a failure, watermarks or resume ids let the channel continue where it stopped
+                flood_waits += 1
+                self.metrics[channel].flood_waits += 1
+                self._flood.pause(e.seconds)
+                if flood_waits >= self.max_flood_waits:
+                    logger.error(f"Giving up channel {channel} after {flood_waits} FloodWaits")
+                    break
             except Exception as e:
                 retries += 1
+                self.metrics[channel].retries += 1
                 logger.error(f"Retry {retries}/{self.retry_limit} for channel {channel} due to error: {str(e)}")
-                await asyncio.sleep(2**retries)  # Exponential backoff
+                await asyncio.sleep(2**retries + random.uniform(0, 1))  # Exponential backoff with jitter
         return []
 
+    def _log_metrics(self) -> None:
+        for channel, metrics in self.metrics.items():
+            logger.info(f"{channel}: {metrics.to_dict()}")
+        total = sum(m.messages for m in self.metrics.values())
+        logger.info(
+            f"Scraped {total} messages from {len(self.metrics)} channels, {self._flood.flood_waits} FloodWaits"
+        )
+
     async def _run(self) -> None:
         if not self.creds:
             logger.error("Please ensure API_ID, API_HASH, and PHONE_NUMBER are set in your .env file.")
@@ -80,10 +183,20 @@ class TelegramScraper(TelegramAsync):
             logger.error("No channels to parse. Please add channels to parse_telegram.json.")
             return
 
-        async with TelegramMessageFetcher(self.creds) as parser:
+        self._slots = FairSlots(self.max_concurrency)
+        self._flood = FloodWaitController()
+        async with AsyncExitStack() as stack:
+            parser = await stack.enter_async_context(
+                TelegramMessageFetcher(self.creds, flood_sleep_threshold=self.flood_sleep_threshold)
+            )
+            if self.save_to_disk:
+                self._writer = await stack.enter_async_context(
+                    AsyncChannelWriter(ChannelWriter(self.output_dir, self.compression), self.max_pending_batches)
+                )
             tasks = [self.retry_process_channel(parser, channel) for channel in self.channels]
             # TODO: return results optionally
             await asyncio.gather(*tasks)
+        self._log_metrics()
 
 
 class TelegramScraperSync:
@@ -95,32 +208,74 @@ class TelegramScraperSync:
         save_to_disk=True,
         batch_size=100,
         retry_limit=3,
+        max_flood_waits=10,
+        incremental=True,
+        state_path=None,
+        iter_params=None,
+        compression=None,
     ):
+        """
+        Args:
+            max_flood_waits (int): FloodWaits a channel may hit before it is given up,
+                counted apart from retry_limit because they are not failures.
+            incremental (bool): Keep per-channel watermarks and fetch only messages that are not saved yet.
+                Only used with save_to_disk.
+            state_path (Union[str, Path]): Watermarks file, defaults to _scrape_state.json in output_dir.
+            iter_params (dict): Extra iter_messages arguments, e.g. wait_time between chunk requests.
+            compression (str): None, 'gzip' or 'zstd' compression of the output files.
+        """
         self.creds = creds
         self.channels = channels or []
         self.save_to_disk = save_to_disk
         self.batch_size = batch_size
         self.output_dir = Path(output_dir) if isinstance(output_dir, str) else output_dir
         self.retry_limit = retry_limit
+        self.max_flood_waits = max_flood_waits
+        self.state = None
+        if incremental and save_to_disk:
+            self.state = ScrapeState(state_path or self.output_dir / "_scrape_state.json")
+        self.iter_params = iter_params or {}
+        self.compression = compression
+        self._writer = None
+        # without watermarks a retried channel continues below the oldest message saved in this run
+        self._resume_ids: Dict[str, int] = {}
+
+    def _fetch_passes(self, channel: str) -> list:
+        if self.state is None:
+            offset_id = self._resume_ids.get(channel)
+            return [("backfill", {"offset_id": offset_id} if offset_id else {})]
+        self.state.bootstrap(channel, channel_file_path(channel, self.output_dir, self.compression))
+        return self.state.passes(channel)
+
+    def _save_batch(self, channel: str, message_batch: list) -> None:
+        self._writer.write(channel, message_batch)
+        if self.state is not None:
+            self.state.advance(channel, message_batch)
+        else:
+            # the only pass is a backfill from new to old messages, every batch is older than the previous one
+            self._resume_ids[channel] = min(message["id"] for message in message_batch)
 
     def process_channel(self, parser: TelegramMessageFetcherSync, channel: str) -> dict:
         try:
-            message_batch = []
             message_count = 0
             pbar = tqdm(desc=f"Processing {channel}", unit=" messages")
 
-            for message in parser.iter_channel_messages(channel):
-                processed_message = MessageProcessor(message).process()
-                message_batch.append(processed_message)
-                message_count += 1
-                pbar.update(1)
+            for pass_name, fetch_kwargs in self._fetch_passes(channel):
+                message_batch = []
+                for message in parser.iter_channel_messages(channel, **fetch_kwargs, **self.iter_params):
+                    processed_message = MessageProcessor(message).process()
+                    message_batch.append(processed_message)
+                    message_count += 1
+                    pbar.update(1)
 
-                if self.save_to_disk and len(message_batch) >= self.batch_size:
-                    save_messages_to_file(channel, message_batch, self.output_dir)
-                    message_batch.clear()
+                    if self.save_to_disk and len(message_batch) >= self.batch_size:
+                        self._save_batch(channel, message_batch)
+                        message_batch.clear()
 
-            if self.save_to_disk and message_batch:
-                save_messages_to_file(channel, message_batch, self.output_dir)
+                if self.save_to_disk and message_batch:
+                    self._save_batch(channel, message_batch)
+                if pass_name == "backfill" and self.state is not None:
+                    self.state.complete(channel)
 
             pbar.close()
             logger.info(f"Processed {message_count} messages from {channel}")
@@ -128,16 +283,25 @@ class TelegramScraperSync:
 
         except Exception as e:
             logger.error(f"Error processing messages from channel {channel}: {str(e)}")
+            raise
 
     def retry_process_channel(self, parser: TelegramMessageFetcherSync, channel: str) -> dict:
         retries = 0
+        flood_waits = 0
         while retries < self.retry_limit:
             try:
                 return self.process_channel(parser, channel)
+            except FloodWaitError as e:
+                # not a failure, the channel continues after the last saved batch
+                flood_waits += 1
+                if flood_waits >= self.max_flood_waits:
+                    logger.error(f"Giving up channel {channel} after {flood_waits} FloodWaits")
+                    break
+                time.sleep(e.seconds + 1)
             except Exception as e:
                 retries += 1
                 logger.error(f"Retry {retries}/{self.retry_limit} for channel {channel} due to error: {str(e)}")
-                time.sleep(2**retries)  # Exponential backoff
+                time.sleep(2**retries + random.uniform(0, 1))  # Exponential backoff with jitter
         return []
 
     def run(self) -> None:
@@ -150,8 +314,14 @@ class TelegramScraperSync:
             return
 
         with TelegramMessageFetcherSync(self.creds) as parser:
-            for channel in self.channels:
-                self.retry_process_channel(parser, channel)
+            if self.save_to_disk:
+                self._writer = ChannelWriter(self.output_dir, self.compression)
+            try:
+                for channel in self.channels:
+                    self.retry_process_channel(parser, channel)
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
 
 
 if __name__ == "__main__":
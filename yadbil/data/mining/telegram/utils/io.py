@@ -1,27 +1,161 @@
+import asyncio
+import gzip
+import io
 import json
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import BinaryIO, Callable, Dict, List, Optional, TextIO, Union
 
-import aiofiles
+from yadbil.utils.logger import get_logger
 
 
-async def save_messages_to_file(channel: str, messages: List[Dict], base_path: Union[Path, str]):
-    """
-    Save a batch of messages from a channel to a JSONL file.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-    Args:
-        channel (str): The name of the channel.
-        messages (List[Dict]): A list of processed message dictionaries.
-        base_path (Path): The directory path where files will be saved.
-    """
-    if isinstance(base_path, str):
-        base_path = Path(base_path)
 
-    base_path.mkdir(parents=True, exist_ok=True)
+logger = get_logger(__name__)
 
-    filename = base_path / f"{channel.replace('/', '_')}.jsonl"
 
-    async with aiofiles.open(filename, "a", encoding="utf-8") as f:
-        for message in messages:
-            json_line = json.dumps(message, ensure_ascii=False)
-            await f.write(json_line + "\n")
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def channel_file_path(channel: str, base_path: Union[Path, str], compression: Optional[str] = None) -> Path:
+    """Path of the JSONL file with messages of the channel."""
+    return Path(base_path) / f"{channel.replace('/', '_')}.jsonl{COMPRESSION_SUFFIXES[compression]}"
+
+
+def channel_name_from_path(path: Path) -> str:
+    """Inverse of channel_file_path up to '/' replacement, e.g. data/chl.jsonl.gz -> chl."""
+    return path.name.split(".jsonl")[0]
+
+
+def open_jsonl(path: Union[Path, str]) -> TextIO:
+    """Open a plain, gzip or zstd JSONL file for reading, compression is detected by suffix."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise ImportError("zstandard is required to read .zst files: pip install zstandard")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class ChannelWriter:
+    def __init__(self, base_path: Union[Path, str], compression: Optional[str] = None):
+        """
+        Appends batches of messages to per-channel JSONL files, keeping one open handle per channel.
+
+        A batch is serialized in one pass and written with a single call. With compression every batch
+        is a complete gzip member / zstd frame, concatenated members are read as one stream,
+        so a crash never leaves a truncated stream behind.
+
+        Args:
+            base_path (Union[Path, str]): Output directory.
+            compression (str): None, 'gzip' or 'zstd' (requires the zstandard package).
+        """
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}. Use one of {list(COMPRESSION_SUFFIXES)}.")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstandard is required for zstd compression: pip install zstandard")
+        self.base_path = Path(base_path)
+        self.base_path.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self._handles: Dict[str, BinaryIO] = {}
+
+    def path(self, channel: str) -> Path:
+        return channel_file_path(channel, self.base_path, self.compression)
+
+    def _encode(self, messages: List[Dict]) -> bytes:
+        data = "".join(json.dumps(message, ensure_ascii=False) + "\n" for message in messages).encode("utf-8")
+        if self.compression == "gzip":
+            return gzip.compress(data, compresslevel=6)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return data
+
+    def write(self, channel: str, messages: List[Dict]) -> None:
+        if not messages:
+            return
+        handle = self._handles.get(channel)
+        if handle is None:
+            handle = self._handles[channel] = open(self.path(channel), "ab")
+        handle.write(self._encode(messages))
+        # batch is on disk (page cache) before watermarks move past it
+        handle.flush()
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+
+    def __enter__(self) -> "ChannelWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class AsyncChannelWriter:
+    def __init__(self, writer: ChannelWriter, max_pending: int = 16):
+        """
+        Single background task draining a bounded queue of batches into a ChannelWriter.
+
+        Producers wait when max_pending batches are queued (backpressure), encoding and writing
+        run in a worker thread, one hop per batch. Callbacks run after the batch is written.
+
+        Args:
+            writer (ChannelWriter): Writer shared with the sync scraper.
+            max_pending (int): Max number of queued batches.
+        """
+        self.writer = writer
+        self.max_pending = max_pending
+        self._queue = None
+        self._task = None
+        self._error = None
+
+    async def __aenter__(self) -> "AsyncChannelWriter":
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.create_task(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self._queue.put(None)
+        await self._task
+        self.writer.close()
+        if self._error is not None and exc_type is None:
+            raise self._error
+
+    async def _consume(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            channel, messages, on_written = item
+            # after a failure batches are dropped, producers must not block on a full queue
+            if self._error is not None:
+                continue
+            try:
+                await asyncio.to_thread(self.writer.write, channel, messages)
+                if on_written is not None:
+                    on_written()
+            except Exception as e:
+                logger.error(f"Failed to write messages of {channel}: {e}")
+                self._error = e
+
+    async def write(
+        self,
+        channel: str,
+        messages: List[Dict],
+        on_written: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Queue a batch, the list must not be modified afterwards."""
+        if self._error is not None:
+            raise self._error
+        await self._queue.put((channel, messages, on_written))
+
+    async def after_pending(self, callback: Callable[[], None]) -> None:
+        """Run the callback once all batches queued so far are written."""
+        await self.write("", [], callback)
@@ -1,3 +1,5 @@
+from typing import Dict, Tuple, Type
+
 from telethon.tl.types import (
     MessageReplyHeader,
     MessageReplyStoryHeader,
@@ -7,6 +9,22 @@ from telethon.tl.types import (
 )
 
 
+UTF16 = "utf-16-le"
+
+# optional entity attributes copied to the entity info
+ENTITY_FIELDS = ("url", "user_id", "language", "document_id")
+
+# entity type -> its fields from ENTITY_FIELDS, filled on the first entity of every type
+_entity_fields: Dict[Type, Tuple[str, ...]] = {}
+
+
+def _fields_of(entity) -> Tuple[str, ...]:
+    fields = _entity_fields.get(type(entity))
+    if fields is None:
+        fields = _entity_fields[type(entity)] = tuple(field for field in ENTITY_FIELDS if hasattr(entity, field))
+    return fields
+
+
 class MessageProcessor:
     def __init__(self, message):
         """
@@ -16,6 +34,14 @@ class MessageProcessor:
             message: A Telethon message object.
         """
         self.message = message
+        self._message_buffer = None
+
+    @property
+    def message_buffer(self) -> memoryview:
+        """Message text encoded to UTF-16 once, entity offsets and lengths are in its code units."""
+        if self._message_buffer is None:
+            self._message_buffer = memoryview((self.message.message or "").encode(UTF16))
+        return self._message_buffer
 
     def extract_reactions(self):
         """
@@ -40,39 +66,29 @@ class MessageProcessor:
 
         return extracted
 
-    def extract_entity_info(self, entity):
+    def extract_entity_info(self, entity, buffer: memoryview = None):
         """
         Extract entity information from the message.
 
         Args:
             entity: The entity object from the Telethon message.
+            buffer (memoryview): UTF-16 encoded text the entity points to, the message text by default.
 
         Returns:
             dict: A dictionary containing entity information.
         """
-        entity_type = type(entity).__name__
+        if buffer is None:
+            buffer = self.message_buffer
         start_index = entity.offset
         end_index = entity.offset + entity.length
 
-        text = self.message.message.encode("utf-16-le")
-        start_byte = start_index * 2
-        end_byte = end_index * 2
-        extracted_text = text[start_byte:end_byte].decode("utf-16-le")
-
         info = {
-            "type": entity_type,
-            "pos": {"utf-16-le": {"start": start_index, "end": end_index}},
-            "extracted_text": extracted_text,
+            "type": type(entity).__name__,
+            "pos": {UTF16: {"start": start_index, "end": end_index}},
+            "extracted_text": str(buffer[start_index * 2 : end_index * 2], UTF16),
         }
-
-        if hasattr(entity, "url"):
-            info["url"] = entity.url
-        if hasattr(entity, "user_id"):
-            info["user_id"] = entity.user_id
-        if hasattr(entity, "language"):
-            info["language"] = entity.language
-        if hasattr(entity, "document_id"):
-            info["document_id"] = entity.document_id
+        for field in _fields_of(entity):
+            info[field] = getattr(entity, field)
 
         return info
 
@@ -137,6 +153,11 @@ class MessageProcessor:
             return None
 
         if isinstance(reply_to, MessageReplyHeader):
+            quote_entities = None
+            if reply_to.quote_entities:
+                # offsets are relative to the quote text, not to the message
+                quote_buffer = memoryview((reply_to.quote_text or "").encode(UTF16))
+                quote_entities = [self.extract_entity_info(entity, quote_buffer) for entity in reply_to.quote_entities]
             reply_info = {
                 "reply_to_scheduled": reply_to.reply_to_scheduled,
                 "forum_topic": reply_to.forum_topic,
@@ -149,11 +170,7 @@ class MessageProcessor:
                 "reply_media": (str(reply_to.reply_media) if reply_to.reply_media else None),
                 "reply_to_top_id": reply_to.reply_to_top_id,
                 "quote_text": reply_to.quote_text,
-                "quote_entities": (
-                    [self.extract_entity_info(entity) for entity in reply_to.quote_entities]
-                    if reply_to.quote_entities
-                    else None
-                ),
+                "quote_entities": quote_entities,
                 "quote_offset": reply_to.quote_offset,
             }
         elif isinstance(reply_to, MessageReplyStoryHeader):
@@ -174,13 +191,11 @@ class MessageProcessor:
         Returns:
             dict: A dictionary containing processed message information.
         """
-        entities = [
-            {
-                "entity": self.extract_entity_info(entity),
-                "text": text,
-            }
-            for entity, text in self.message.get_entities_text()
-        ]
+        entities = []
+        # the text is sliced from the shared buffer instead of message.get_entities_text()
+        for entity in self.message.entities or ():
+            info = self.extract_entity_info(entity)
+            entities.append({"entity": info, "text": info["extracted_text"]})
 
         return {
             "id": self.message.id,
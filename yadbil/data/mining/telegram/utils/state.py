@@ -0,0 +1,80 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+from yadbil.data.mining.telegram.utils.io import open_jsonl
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class ScrapeState:
+    def __init__(self, path: Union[str, Path]):
+        """
+        Per-channel watermarks of already saved messages, persisted in a json file.
+
+        For every channel messages with ids in [low_id, high_id] are saved without gaps:
+        new messages are fetched in ascending order above high_id (min_id),
+        an unfinished backfill is resumed in descending order below low_id (offset_id).
+        Watermarks move only after a batch is written, so a crash repeats at most one batch.
+
+        Args:
+            path (Union[str, Path]): State json file, created on the first save.
+        """
+        self.path = Path(path)
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.channels = json.load(f)
+
+    def bootstrap(self, channel: str, channel_file: Path) -> None:
+        """Derive watermarks from messages scraped before the state file existed."""
+        if channel in self.channels or not channel_file.exists():
+            return
+        ids = []
+        with open_jsonl(channel_file) as f:
+            for line in f:
+                ids.append(json.loads(line)["id"])
+        if ids:
+            # older history may be missing, let the backfill check it
+            self.channels[channel] = {"high_id": max(ids), "low_id": min(ids), "complete": False}
+            logger.info(f"Bootstrapped watermarks of {channel} from {channel_file}: {self.channels[channel]}")
+
+    def passes(self, channel: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Fetch passes for the channel as (name, iter_messages kwargs)."""
+        state = self.channels.get(channel)
+        if state is None:
+            return [("backfill", {})]
+        passes = [("forward", {"min_id": state["high_id"], "reverse": True})]
+        if not state["complete"]:
+            passes.append(("backfill", {"offset_id": state["low_id"]}))
+        return passes
+
+    def advance(self, channel: str, messages: List[Dict[str, Any]]) -> None:
+        """Extend watermarks with a saved batch of processed messages and persist the state."""
+        if not messages:
+            return
+        newest = max(messages, key=lambda message: message["id"])
+        oldest = min(messages, key=lambda message: message["id"])
+        state = self.channels.setdefault(channel, {"high_id": newest["id"], "low_id": oldest["id"], "complete": False})
+        if newest["id"] >= state["high_id"]:
+            state["high_id"], state["high_date"] = newest["id"], newest["date"]
+        if oldest["id"] <= state["low_id"]:
+            state["low_id"], state["low_date"] = oldest["id"], oldest["date"]
+        self.save()
+
+    def complete(self, channel: str) -> None:
+        """Mark the history of the channel as fully saved."""
+        # channel without messages, forward passes start from the beginning
+        state = self.channels.setdefault(channel, {"high_id": 0, "low_id": 0})
+        state["complete"] = True
+        self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.channels, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
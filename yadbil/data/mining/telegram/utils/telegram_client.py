@@ -1,6 +1,7 @@
 from typing import Any, AsyncIterator, Dict, Iterator, Union
 
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 from telethon.sync import TelegramClient as SyncTelegramClient
 from telethon.tl.functions.channels import GetFullChannelRequest
 from telethon.tl.functions.messages import GetFullChatRequest
@@ -14,32 +15,45 @@ from telethon.tl.types import (
 
 # TODO: change config to parameters
 class TelegramMessageFetcher:
-    def __init__(self, creds):
+    def __init__(self, creds, flood_sleep_threshold: int = 60):
+        """
+        Args:
+            creds: Telegram credentials.
+            flood_sleep_threshold (int): FloodWaits up to this many seconds are slept inside telethon,
+                longer ones are raised as FloodWaitError.
+        """
         self.client = None
         self.creds = creds
+        self.flood_sleep_threshold = flood_sleep_threshold
 
     async def __aenter__(self):
-        self.client = TelegramClient("session", self.creds.api_id, self.creds.api_hash)
+        self.client = TelegramClient(
+            "session", self.creds.api_id, self.creds.api_hash, flood_sleep_threshold=self.flood_sleep_threshold
+        )
         await self.client.start(phone=self.creds.phone_number)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.client.disconnect()
 
-    async def iter_channel_messages(self, channel: str, limit: int = None) -> AsyncIterator[Any]:
+    async def iter_channel_messages(self, channel: str, limit: int = None, **kwargs: Any) -> AsyncIterator[Any]:
         """
         Iterate over messages from a specified channel.
 
         Args:
             channel (str): The channel username or ID.
             limit (int, optional): The maximum number of messages to retrieve. Defaults to None (all messages).
+            **kwargs: Other iter_messages arguments, e.g. min_id, offset_id and reverse for incremental scraping.
 
         Yields:
             Any: Telethon message objects.
         """
         try:
-            async for message in self.client.iter_messages(channel, limit=limit):
+            async for message in self.client.iter_messages(channel, limit=limit, **kwargs):
                 yield message
+        except FloodWaitError:
+            # callers pace all requests of the account by its seconds
+            raise
         except Exception as e:
             raise Exception(f"Error retrieving messages from channel {channel}: {str(e)}")
 
@@ -136,20 +150,24 @@ class TelegramMessageFetcherSync:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.client.disconnect()
 
-    def iter_channel_messages(self, channel: str, limit: int = None) -> Iterator[Any]:
+    def iter_channel_messages(self, channel: str, limit: int = None, **kwargs: Any) -> Iterator[Any]:
         """
         Iterate over messages from a specified channel.
 
         Args:
             channel (str): The channel username or ID.
             limit (int, optional): The maximum number of messages to retrieve. Defaults to None (all messages).
+            **kwargs: Other iter_messages arguments, e.g. min_id, offset_id and reverse for incremental scraping.
 
         Yields:
             Any: Telethon message objects.
         """
         try:
-            for message in self.client.iter_messages(channel, limit=limit):
+            for message in self.client.iter_messages(channel, limit=limit, **kwargs):
                 yield message
+        except FloodWaitError:
+            # callers pace all requests of the account by its seconds
+            raise
         except Exception as e:
             raise Exception(f"Error retrieving messages from channel {channel}: {str(e)}")
 
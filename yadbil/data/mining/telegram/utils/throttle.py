@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict
+
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class FloodWaitController:
+    def __init__(self, margin: float = 1.0):
+        """
+        Pause shared by all scraping tasks of one client.
+
+        Telegram rate limits the account, not a single request, so after a FloodWait
+        every task has to wait, otherwise the others keep extending the ban.
+
+        Args:
+            margin (float): Seconds added on top of the wait requested by Telegram.
+        """
+        self.margin = margin
+        self.resume_at = 0.0
+        self.flood_waits = 0
+
+    def pause(self, seconds: float) -> None:
+        self.flood_waits += 1
+        resume_at = time.monotonic() + seconds + self.margin
+        if resume_at > self.resume_at:
+            logger.warning(f"FloodWait for {seconds}s, pausing all channels")
+            self.resume_at = resume_at
+
+    async def wait(self) -> None:
+        """Return immediately unless a pause is active, cheap enough to call before every message."""
+        while (delay := self.resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+class FairSlots:
+    def __init__(self, n_slots: int):
+        """
+        Counting semaphore that hands a released slot directly to the longest waiting task.
+
+        asyncio.Semaphore before Python 3.11 lets a task that releases and re-acquires at once
+        take the slot back before the woken waiter runs, so yielding a slot would not let anyone in.
+
+        Args:
+            n_slots (int): Number of tasks holding a slot at the same time.
+        """
+        self._free = n_slots
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def has_waiters(self) -> bool:
+        return any(not waiter.done() for waiter in self._waiters)
+
+    async def acquire(self) -> None:
+        if self._free > 0 and not self.has_waiters():
+            self._free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # the slot could be handed over right before the cancellation
+            if not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free += 1
+
+    async def yield_slot(self) -> None:
+        """Give the slot to the first waiting task and queue behind the ones already waiting."""
+        if not self.has_waiters():
+            return
+        self.release()
+        await self.acquire()
+
+    async def __aenter__(self) -> "FairSlots":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+
+@dataclass
+class ChannelMetrics:
+    messages: int = 0
+    seconds: float = 0.0
+    retries: int = 0
+    flood_waits: int = 0
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "messages_per_second": round(self.messages_per_second, 2)}
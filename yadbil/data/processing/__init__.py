@@ -1,4 +1,9 @@
-from yadbil.data.processing.text.processing import TextProcessor
+from yadbil.utils.lazy import lazy_getattr
 
 
-TEXT_STEPS = [TextProcessor]
+# keeps nltk out of imports of light submodules, e.g. text.utils.vocab
+__getattr__ = lazy_getattr(
+    __name__,
+    attrs={"TextProcessor": "yadbil.data.processing.text.processing"},
+    groups={"TEXT_STEPS": ["TextProcessor"]},
+)
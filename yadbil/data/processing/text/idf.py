@@ -2,6 +2,8 @@ from collections import defaultdict
 
 import numpy as np
 
+from yadbil.data.processing.text.utils.vocab import TokenIds, Vocab
+
 
 # TODO: move somewhere
 def calculate_idf(posts, words_key="stemmed_words", min_max_scale=False):
@@ -30,3 +32,28 @@ def calculate_idf(posts, words_key="stemmed_words", min_max_scale=False):
         idf = {word: (idf[word] - min_idf) / (max_idf - min_idf) for word in idf}
 
     return idf
+
+
+def calculate_idf_from_token_ids(token_ids: TokenIds, vocab: Vocab, min_max_scale=False):
+    """Same as calculate_idf, but document frequencies are counted over token id arrays.
+
+    Args:
+        token_ids: Token ids of the posts saved by TextProcessor.
+        vocab: Vocabulary of token_ids.
+        min_max_scale (bool): If True, apply min-max scaling to the IDF values.
+
+    Returns:
+        A dictionary where keys are words present in the posts and values are their IDF scores.
+    """
+    # unique (doc, token) pairs, so a word counts once per post
+    doc_index = np.repeat(np.arange(len(token_ids)), token_ids.lengths)
+    pairs = np.unique(doc_index * len(vocab) + token_ids.ids)
+    df = np.bincount(pairs % len(vocab), minlength=len(vocab))
+
+    present = np.flatnonzero(df)
+    idf = np.log(len(token_ids) / df[present])
+
+    if min_max_scale:
+        idf = (idf - idf.min()) / (idf.max() - idf.min())
+
+    return dict(zip(vocab.decode(present.tolist()), idf.tolist()))
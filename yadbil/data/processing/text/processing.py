@@ -1,14 +1,24 @@
 import json
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-import nltk
 from tqdm.auto import tqdm
 
 from yadbil.data.processing.text.utils.regexps import EMAIL_REGEX, URL_REGEX
+from yadbil.data.processing.text.utils.spans import substitute_regex
 from yadbil.data.processing.text.utils.stemmer import MultilingualStemmer
 from yadbil.data.processing.text.utils.stopwords import MultilingualStopwordRemover
+from yadbil.data.processing.text.utils.tokenizer import get_tokenizer, is_word
+from yadbil.data.processing.text.utils.vocab import TokenIds, TokenIdsBuilder
+from yadbil.utils.columnar import ColumnarDataset, ColumnarWriter, is_columnar, jsonl_to_columnar
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class TextProcessor:
@@ -25,7 +35,42 @@ class TextProcessor:
         remove_stopwords: bool = True,
         do_stemming: bool = True,
         min_word_length: int = 2,
+        stem_cache_size: int = 100_000,
+        stem_cache_path: Union[str, Path] = None,
+        keep_word_mappings: bool = True,
+        tokenizer: str = "nltk",
+        token_ids_fields: Tuple[str, ...] = None,
+        output_format: str = "jsonl",
+        n_workers: int = 1,
+        chunk_size: int = 16 * 1024 * 1024,
     ):
+        # kept to rebuild the same processor inside worker processes
+        self._params = {
+            "input_path": input_path,
+            "output_path": output_path,
+            "split_into_words": split_into_words,
+            "email_replacement_str": email_replacement_str,
+            "url_replacement_str": url_replacement_str,
+            "column_to_process": column_to_process,
+            "languages": languages,
+            "to_lower": to_lower,
+            "remove_stopwords": remove_stopwords,
+            "do_stemming": do_stemming,
+            "min_word_length": min_word_length,
+            "stem_cache_size": stem_cache_size,
+            "stem_cache_path": stem_cache_path,
+            "keep_word_mappings": keep_word_mappings,
+            "tokenizer": tokenizer,
+            "token_ids_fields": token_ids_fields,
+            "output_format": output_format,
+        }
+        self.n_workers = n_workers if n_workers > 0 else os.cpu_count()
+        # "jsonl" or "columnar" (directory, see utils/columnar.py), the input format is detected
+        if output_format not in ("jsonl", "columnar"):
+            raise ValueError(f"Unknown output_format: {output_format}. Use 'jsonl' or 'columnar'.")
+        self.output_format = output_format
+        self.chunk_size = chunk_size
+
         self.input_path = input_path if isinstance(input_path, Path) else Path(input_path)
         self.output_path = output_path if isinstance(output_path, Path) else Path(output_path)
         self.column_to_process = column_to_process
@@ -34,8 +79,19 @@ class TextProcessor:
         self.remove_stopwords = remove_stopwords
         self.do_stemming = do_stemming
         self.min_word_length = min_word_length
+        self.stem_cache_path = stem_cache_path
+        # mappings are only needed for UI/graph views, search-only pipelines can drop them
+        self.keep_word_mappings = keep_word_mappings
 
         self.split_into_words = split_into_words
+        # "nltk" (word_tokenize) or "regex" (single pass, several times faster, see utils/tokenizer.py)
+        self.tokenizer = get_tokenizer(tokenizer, min_word_length)
+
+        # fields of processed_text interned to int32 arrays saved next to the output, e.g. ("stemmed_words",)
+        self.token_ids_fields = tuple(token_ids_fields) if token_ids_fields else None
+        if self.token_ids_fields is not None and not self.split_into_words:
+            raise ValueError("token_ids_fields requires split_into_words.")
+        self.token_ids = TokenIdsBuilder(self.token_ids_fields) if self.token_ids_fields is not None else None
 
         self.email_replacement_str = email_replacement_str
         if self.email_replacement_str is not None:
@@ -49,18 +105,21 @@ class TextProcessor:
             self.stopword_remover = MultilingualStopwordRemover(self.languages)
 
         if self.do_stemming:
-            self.stemmer = MultilingualStemmer(self.languages)
+            self.stemmer = MultilingualStemmer(
+                self.languages,
+                cache_size=stem_cache_size,
+                cache_path=stem_cache_path,
+            )
 
     def sub_emails(self, text: str) -> str:
         """Substitute emails with a placeholder"""
-        return self.email_regex(self.email_replacement_str, text)
+        return substitute_regex(self.email_regex, text, self.email_replacement_str)
 
     def sub_urls(self, text: str) -> str:
         """Substitute URLs with a placeholder"""
-        return self.url_regex(self.url_replacement_str, text)
+        return substitute_regex(self.url_regex, text, self.url_replacement_str)
 
-    def is_word(self, word: str) -> bool:
-        return any(char.isalpha() for char in word)
+    is_word = staticmethod(is_word)
 
     def process_text(self, text: str) -> Dict[str, Any]:
         """Processes text data for graph-based recommendation system.
@@ -69,7 +128,8 @@ class TextProcessor:
             text (str): The input text.
 
         Returns:
-            dict: A dictionary with preprocessed words, words-to-stemmed mapping, and stemmed-to-words mapping.
+            dict: A dictionary with preprocessed words, stemmed words and, if keep_word_mappings is set,
+                words-to-stemmed and stemmed-to-words mappings.
         """
         if self.email_replacement_str is not None:
             text = self.sub_emails(text)
@@ -81,8 +141,7 @@ class TextProcessor:
         if not self.split_into_words:
             return {"text": text}
 
-        words = nltk.word_tokenize(text)
-        words = [word for word in words if self.is_word(word) and len(word) >= self.min_word_length]
+        words = self.tokenizer(text)
 
         if self.remove_stopwords:
             words = self.stopword_remover.remove(words)
@@ -95,17 +154,119 @@ class TextProcessor:
         # well, it should be with dict in latest python versions, but still
         # idk about .values() method
         if self.do_stemming:
-            stemmed_dict = {word: self.stemmer.stem(word) for word in words}
-            stemmed_to_orig_dict = {
-                v: [k for k, vv in stemmed_dict.items() if vv == v] for v in set(stemmed_dict.values())
-            }
-
+            stemmed_dict = {word: self.stemmer.stem(word) for word in dict.fromkeys(words)}
             result["stemmed_words"] = list(stemmed_dict.values())
-            result["words_to_stemmed"] = stemmed_dict
-            result["stemmed_to_words"] = stemmed_to_orig_dict
+
+            if self.keep_word_mappings:
+                stemmed_to_orig_dict = {}
+                for word, stemmed in stemmed_dict.items():
+                    stemmed_to_orig_dict.setdefault(stemmed, []).append(word)
+
+                result["words_to_stemmed"] = stemmed_dict
+                result["stemmed_to_words"] = stemmed_to_orig_dict
 
         return result
 
+    def process_line(self, line: str) -> str:
+        """Process a single JSONL record and return it serialized back with a trailing newline."""
+        item = json.loads(line)
+        item["processed_text"] = self.process_text(item[self.column_to_process])
+        if self.token_ids is not None:
+            self.token_ids.add(item["processed_text"])
+        return json.dumps(item, ensure_ascii=False) + "\n"
+
+    def _split_into_shards(self) -> List[Tuple[int, int]]:
+        """Split the input file into byte ranges of roughly chunk_size aligned to line ends."""
+        file_size = self.input_path.stat().st_size
+        shards = []
+        with open(self.input_path, "rb") as f:
+            start = 0
+            while start < file_size:
+                f.seek(min(start + self.chunk_size, file_size))
+                f.readline()
+                end = f.tell()
+                shards.append((start, end))
+                start = end
+        return shards
+
+    def _run_parallel(self, out_file) -> None:
+        shards = self._split_into_shards()
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_init_worker,
+            initargs=(self._params,),
+        ) as executor:
+            # bounded window of in-flight shards, results are written in the input order
+            in_flight = deque()
+            pbar = tqdm(total=len(shards), desc="Processing shards")
+            for shard in shards:
+                if len(in_flight) >= 2 * self.n_workers:
+                    self._write_shard(out_file, *in_flight.popleft().result())
+                    pbar.update(1)
+                in_flight.append(executor.submit(_process_shard, self.input_path, *shard))
+            while in_flight:
+                self._write_shard(out_file, *in_flight.popleft().result())
+                pbar.update(1)
+            pbar.close()
+
+    def _write_shard(self, out_file, text: str, token_ids: Optional[Tuple[List[str], Dict[str, TokenIds]]]) -> None:
+        out_file.write(text)
+        if token_ids is not None:
+            # every shard has its own vocabulary, ids are remapped to the shared one
+            self.token_ids.merge(*token_ids)
+
+    def _iter_processed_texts(self, texts: List[str], batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """process_text over a column of texts in the input order, in worker processes with n_workers > 1."""
+        batches = [texts[start : start + batch_size] for start in range(0, len(texts), batch_size)]
+        if self.n_workers == 1:
+            for batch in tqdm(batches, desc="Processing batches"):
+                yield from (self.process_text(text) for text in batch)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_init_worker,
+            initargs=(self._params,),
+        ) as executor:
+            in_flight = deque()
+            for batch in tqdm(batches, desc="Processing batches"):
+                if len(in_flight) >= 2 * self.n_workers:
+                    yield from in_flight.popleft().result()
+                in_flight.append(executor.submit(_process_texts, batch))
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _run_columnar(self) -> None:
+        """Columnar input: only column_to_process is read, with columnar output the other columns are copied."""
+        dataset = ColumnarDataset(self.input_path)
+        processed = self._iter_processed_texts(dataset.column(self.column_to_process))
+        if self.token_ids is not None:
+            processed = self._add_token_ids(processed)
+
+        if self.output_format == "columnar":
+            with ColumnarWriter(self.output_path, base=self.input_path) as writer:
+                for processed_text in processed:
+                    writer.write({"processed_text": processed_text})
+        else:
+            with open(self.output_path, "w") as out_file:
+                for item, processed_text in zip(dataset.iter_records(), processed):
+                    item["processed_text"] = processed_text
+                    out_file.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def _add_token_ids(self, processed: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for processed_text in processed:
+            self.token_ids.add(processed_text)
+            yield processed_text
+
+    def _run_jsonl(self, output_path: Path) -> None:
+        with open(output_path, "w") as out_file:
+            if self.n_workers > 1:
+                self._run_parallel(out_file)
+            else:
+                with open(self.input_path) as in_file:
+                    for line in tqdm(in_file):
+                        out_file.write(self.process_line(line))
+
     # TODO: implement return of processed data if no output path is provided
     def run(self, data=None):
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -114,12 +275,50 @@ class TextProcessor:
             if self.input_path is None:
                 raise ValueError("No input data provided.")
 
-        with open(self.input_path) as in_file:
-            with open(self.output_path, "w") as out_file:
-                for line in tqdm(in_file):
-                    item = json.loads(line)
-                    item["processed_text"] = self.process_text(item[self.column_to_process])
-                    out_file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if is_columnar(self.input_path):
+            self._run_columnar()
+        elif self.output_format == "columnar":
+            tmp_path = self.output_path.with_name(f".{self.output_path.name}.jsonl.tmp")
+            self._run_jsonl(tmp_path)
+            jsonl_to_columnar(tmp_path, self.output_path)
+            tmp_path.unlink()
+        else:
+            self._run_jsonl(self.output_path)
+
+        if self.token_ids is not None:
+            self.token_ids.save(self.output_path)
+            logger.info(f"Saved token ids of {self.token_ids_fields}, vocabulary size: {len(self.token_ids.vocab)}")
+
+        # workers in parallel mode only read the warm cache, their new entries are not merged back
+        if self.do_stemming and self.n_workers == 1:
+            logger.info(f"Stem cache stats: {self.stemmer.cache_info()}")
+            if self.stem_cache_path is not None:
+                self.stemmer.save_cache(self.stem_cache_path)
+
+
+# processor is built once per worker process and reused for all its shards
+_worker_processor: Optional[TextProcessor] = None
+
+
+def _init_worker(params: Dict[str, Any]) -> None:
+    global _worker_processor
+    _worker_processor = TextProcessor(**params)
+
+
+def _process_shard(path: Path, start: int, end: int) -> Tuple[str, Optional[Tuple[List[str], Dict[str, TokenIds]]]]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).decode("utf-8").split("\n")
+    if _worker_processor.token_ids_fields is not None:
+        _worker_processor.token_ids = TokenIdsBuilder(_worker_processor.token_ids_fields)
+    text = "".join(_worker_processor.process_line(line) for line in lines if line.strip())
+    if _worker_processor.token_ids is None:
+        return text, None
+    return text, (_worker_processor.token_ids.vocab.tokens, _worker_processor.token_ids.build())
+
+
+def _process_texts(texts: List[str]) -> List[Dict[str, Any]]:
+    return [_worker_processor.process_text(text) for text in texts]
 
 
 if __name__ == "__main__":
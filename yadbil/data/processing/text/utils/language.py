@@ -1,9 +1,5 @@
 from typing import Dict, Optional, Set, Tuple
 
-from yadbil.data.processing.text.utils.load import load_nltk_data
-
-
-load_nltk_data()
 
 # Define character sets for different languages
 LANGUAGE_CHARS: Dict[str, Set[str]] = {
@@ -1,7 +1,11 @@
-import nltk
+from functools import lru_cache
 
 
+@lru_cache(maxsize=None)
 def load_nltk_data():
+    """Check nltk resources once per process, called by the components that need them instead of at import."""
+    import nltk
+
     try:
         nltk.data.find("tokenizers/punkt")
         nltk.data.find("corpora/stopwords")
@@ -0,0 +1,72 @@
+import re
+from typing import Iterable, List, Tuple
+
+
+Span = Tuple[int, int]
+
+UTF16 = "utf-16-le"
+
+
+def merge_spans(spans: Iterable[Span]) -> List[Span]:
+    """Sort spans and merge overlapping or touching ones, empty spans are dropped."""
+    merged: List[List[int]] = []
+    for start, end in sorted(spans):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(span) for span in merged]
+
+
+def substitute_spans(text: str, spans: Iterable[Span], replacement: str) -> str:
+    """
+    Replace [start, end) spans of the text with the replacement in one linear pass.
+
+    Args:
+        text (str): Source text.
+        spans (Iterable[Span]): Spans in python string indices, may be unsorted and overlapping.
+        replacement (str): Literal replacement, backslashes are not interpreted as in re.sub.
+
+    Returns:
+        str: Text with every span replaced.
+    """
+    pieces = []
+    prev = 0
+    for start, end in merge_spans(spans):
+        pieces.append(text[prev:start])
+        pieces.append(replacement)
+        prev = end
+    pieces.append(text[prev:])
+    return "".join(pieces)
+
+
+def substitute_utf16_spans(text: str, spans: Iterable[Span], replacement: str) -> str:
+    """
+    Same as substitute_spans, but spans are offsets in UTF-16 code units as Telegram entities store them.
+
+    The text is encoded once and sliced as bytes, so astral characters (e.g. emoji)
+    before a span do not shift it and no per-character offset mapping is built.
+    """
+    spans = merge_spans(spans)
+    if not spans:
+        return text
+    # offsets are equal to string indices when there are no surrogate pairs
+    if text.isascii():
+        return substitute_spans(text, spans, replacement)
+    encoded = text.encode(UTF16)
+    encoded_replacement = replacement.encode(UTF16)
+    pieces = []
+    prev = 0
+    for start, end in spans:
+        pieces.append(encoded[prev : 2 * start])
+        pieces.append(encoded_replacement)
+        prev = 2 * end
+    pieces.append(encoded[prev:])
+    return b"".join(pieces).decode(UTF16)
+
+
+def substitute_regex(regex: re.Pattern, text: str, replacement: str) -> str:
+    """Replace all matches of the compiled regex with a literal replacement."""
+    return substitute_spans(text, (match.span() for match in regex.finditer(text)), replacement)
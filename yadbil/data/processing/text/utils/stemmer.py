@@ -1,21 +1,81 @@
-from typing import Tuple
-
-from nltk.stem import SnowballStemmer
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple, Union
 
 from yadbil.data.processing.text.utils.language import detect_language
-from yadbil.data.processing.text.utils.load import load_nltk_data
-
-
-load_nltk_data()
 
 
 class MultilingualStemmer:
-    def __init__(self, languages: Tuple[str, ...]):
+    def __init__(
+        self,
+        languages: Tuple[str, ...],
+        cache_size: int = 100_000,
+        cache_path: Union[str, Path] = None,
+    ):
+        """
+        Args:
+            languages (Tuple[str, ...]): Languages to stem.
+            cache_size (int): Max number of memoized words, least recently used are evicted. 0 disables the cache.
+            cache_path (Union[str, Path]): Optional json file to warm up the cache from.
+        """
+        # importing nltk takes most of the startup time, snowball stemmers need no nltk data
+        from nltk.stem import SnowballStemmer
+
         self.languages = languages
         self.stemmers = {lang: SnowballStemmer(lang) for lang in languages}
 
-    def stem(self, word: str) -> str:
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_path is not None and Path(cache_path).exists():
+            self.load_cache(cache_path)
+
+    def _stem(self, word: str) -> str:
         detected_lang = detect_language(word, self.languages)
         if detected_lang:
             return self.stemmers[detected_lang].stem(word)
         return word  # Return the original word if language not detected
+
+    def stem(self, word: str) -> str:
+        if not self.cache_size:
+            return self._stem(word)
+
+        stemmed = self.cache.get(word)
+        if stemmed is not None:
+            self.hits += 1
+            self.cache.move_to_end(word)
+            return stemmed
+
+        self.misses += 1
+        stemmed = self._stem(word)
+        self.cache[word] = stemmed
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return stemmed
+
+    def cache_info(self) -> Dict[str, Union[int, float]]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.cache),
+            "max_size": self.cache_size,
+        }
+
+    def save_cache(self, path: Union[str, Path]) -> None:
+        """Save cached stems as [word, stem] pairs from least to most recently used."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(list(self.cache.items()), f, ensure_ascii=False)
+
+    def load_cache(self, path: Union[str, Path]) -> None:
+        with open(path) as f:
+            pairs = json.load(f)
+        # keep the most recent entries if the file was saved with a bigger cache
+        for word, stemmed in pairs[-self.cache_size :] if self.cache_size else []:
+            self.cache[word] = stemmed
@@ -1,16 +1,15 @@
 from typing import List, Tuple
 
-from nltk.corpus import stopwords
 from stop_words import get_stop_words
 
 from yadbil.data.processing.text.utils.load import load_nltk_data
 
 
-load_nltk_data()
-
-
 class MultilingualStopwordRemover:
     def __init__(self, languages: Tuple[str, ...]):
+        from nltk.corpus import stopwords
+
+        load_nltk_data()
         self.stop_words = set()
         for language in languages:
             self.stop_words.update(get_stop_words(language))
@@ -0,0 +1,111 @@
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List
+
+from yadbil.data.processing.text.utils.load import load_nltk_data
+
+
+Tokenizer = Callable[[str], List[str]]
+
+# words with inner hyphens/apostrophes stay whole: кто-то, 2024-й, don't, it’s
+# unlike nltk, trailing dots and ellipses of abbreviations (млн., рост…) are not part of the token
+TOKEN_REGEX = re.compile(r"\w+(?:[-'’]\w+)*")
+
+
+def is_word(word: str) -> bool:
+    return word.isalpha() or any(char.isalpha() for char in word)
+
+
+class RegexTokenizer:
+    def __init__(self, min_word_length: int = 2, pattern: re.Pattern = TOKEN_REGEX):
+        """
+        Single pass Unicode regex tokenizer with the word filters of TextProcessor fused in.
+
+        Tokens are matched and filtered in one comprehension, without sentence splitting
+        and without an intermediate list of unfiltered tokens.
+
+        Args:
+            min_word_length (int): Shorter tokens are dropped.
+            pattern (re.Pattern): Compiled token pattern.
+        """
+        self.min_word_length = min_word_length
+        self.pattern = pattern
+
+    def __call__(self, text: str) -> List[str]:
+        min_len = self.min_word_length
+        # is_word inlined, isalpha() is a C fast path for the common case
+        return [
+            word
+            for word in self.pattern.findall(text)
+            if len(word) >= min_len and (word.isalpha() or any(char.isalpha() for char in word))
+        ]
+
+
+class NltkTokenizer:
+    def __init__(self, min_word_length: int = 2, preserve_line: bool = False):
+        """
+        nltk.word_tokenize (Punkt sentence splitter + Treebank regexes) followed by the word filters.
+
+        Args:
+            min_word_length (int): Shorter tokens are dropped.
+            preserve_line (bool): Skip the Punkt sentence splitter.
+        """
+        from nltk import word_tokenize
+
+        load_nltk_data()
+        self.min_word_length = min_word_length
+        self.preserve_line = preserve_line
+        self.word_tokenize = word_tokenize
+
+    def __call__(self, text: str) -> List[str]:
+        words = self.word_tokenize(text, preserve_line=self.preserve_line)
+        return [word for word in words if is_word(word) and len(word) >= self.min_word_length]
+
+
+TOKENIZERS = {
+    "nltk": NltkTokenizer,
+    "regex": RegexTokenizer,
+}
+
+
+def get_tokenizer(name: str, min_word_length: int = 2) -> Tokenizer:
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer: {name}. Use one of {list(TOKENIZERS)}.")
+    return TOKENIZERS[name](min_word_length=min_word_length)
+
+
+def conformance_report(
+    texts: Iterable[str],
+    tokenizer: Tokenizer,
+    reference: Tokenizer,
+    top_n: int = 20,
+) -> Dict[str, object]:
+    """
+    Token diff of a tokenizer against a reference one, computed per text as multisets.
+
+    Returns:
+        dict: Number of texts, share of texts with identical tokens, token counts,
+            micro-averaged precision/recall of the tokenizer and the most common extra/missing tokens.
+    """
+    n_texts, n_identical = 0, 0
+    n_tokens, n_reference, n_common = 0, 0, 0
+    extra, missing = Counter(), Counter()
+    for text in texts:
+        tokens, reference_tokens = Counter(tokenizer(text)), Counter(reference(text))
+        n_texts += 1
+        n_identical += tokens == reference_tokens
+        n_tokens += sum(tokens.values())
+        n_reference += sum(reference_tokens.values())
+        n_common += sum((tokens & reference_tokens).values())
+        extra.update(tokens - reference_tokens)
+        missing.update(reference_tokens - tokens)
+    return {
+        "texts": n_texts,
+        "identical_texts": n_identical / n_texts if n_texts else 0.0,
+        "tokens": n_tokens,
+        "reference_tokens": n_reference,
+        "precision": n_common / n_tokens if n_tokens else 0.0,
+        "recall": n_common / n_reference if n_reference else 0.0,
+        "top_extra": extra.most_common(top_n),
+        "top_missing": missing.most_common(top_n),
+    }
@@ -0,0 +1,195 @@
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+
+
+VOCAB_SUFFIX = ".vocab.json"
+
+
+def vocab_path(jsonl_path: Union[str, Path]) -> Path:
+    """Vocabulary file saved next to a JSONL file, e.g. all_channels.jsonl -> all_channels.vocab.json."""
+    jsonl_path = Path(jsonl_path)
+    return jsonl_path.with_name(f"{jsonl_path.stem}{VOCAB_SUFFIX}")
+
+
+def token_ids_path(jsonl_path: Union[str, Path], field: str) -> Path:
+    """Token id arrays of a field next to a JSONL file, e.g. all_channels.stemmed_words.npz."""
+    jsonl_path = Path(jsonl_path)
+    return jsonl_path.with_name(f"{jsonl_path.stem}.{field}.npz")
+
+
+class Vocab:
+    def __init__(self, tokens: Iterable[str] = ()):
+        """
+        Interns tokens to dense int ids in order of first appearance.
+
+        Args:
+            tokens (Iterable[str]): Initial tokens, their ids are their positions.
+        """
+        self.tokens: List[str] = []
+        self.token_to_id: Dict[str, int] = {}
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.token_to_id
+
+    def add(self, token: str) -> int:
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = self.token_to_id[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def encode(self, tokens: Sequence[str]) -> List[int]:
+        token_to_id = self.token_to_id
+        return [token_to_id[token] if token in token_to_id else self.add(token) for token in tokens]
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.tokens[i] for i in ids]
+
+    def save(self, path: Union[str, Path]) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.tokens, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Vocab":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+class TokenIds:
+    def __init__(self, indptr: np.ndarray, ids: np.ndarray):
+        """
+        Token ids of all documents in CSR layout: document i is ids[indptr[i]:indptr[i + 1]].
+
+        Args:
+            indptr (np.ndarray): int64 offsets of length n_docs + 1.
+            ids (np.ndarray): int32 token ids of all documents concatenated.
+        """
+        self.indptr = indptr
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        return self.ids[self.indptr[row] : self.indptr[row + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def to_lists(self) -> List[List[int]]:
+        return [doc.tolist() for doc in np.split(self.ids, self.indptr[1:-1])]
+
+    def take(self, rows: Sequence[int]) -> "TokenIds":
+        """Subset of documents in the given order, e.g. rows kept by a filter."""
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.lengths[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # position of every output token in self.ids
+        positions = np.repeat(self.indptr[rows] - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return TokenIds(indptr, self.ids[positions])
+
+    @classmethod
+    def from_lists(cls, docs: Sequence[Sequence[int]]) -> "TokenIds":
+        indptr = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for doc in docs], out=indptr[1:])
+        ids = np.fromiter((i for doc in docs for i in doc), dtype=np.int32, count=indptr[-1])
+        return cls(indptr, ids)
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["TokenIds"]) -> "TokenIds":
+        if not parts:
+            return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        offsets = np.cumsum([0] + [len(part.ids) for part in parts[:-1]])
+        indptr = np.concatenate([parts[0].indptr[:1]] + [part.indptr[1:] + off for part, off in zip(parts, offsets)])
+        return cls(indptr, np.concatenate([part.ids for part in parts]).astype(np.int32, copy=False))
+
+    def save(self, path: Union[str, Path]) -> None:
+        np.savez(path, indptr=self.indptr, ids=self.ids)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "TokenIds":
+        with np.load(path) as arrays:
+            return cls(arrays["indptr"], arrays["ids"])
+
+
+class TokenIdsBuilder:
+    def __init__(self, fields: Sequence[str], vocab: Vocab = None):
+        """
+        Collects token ids of several fields of processed records, all fields share one vocabulary.
+
+        Args:
+            fields (Sequence[str]): Keys of processed_text with token lists, e.g. ("words", "stemmed_words").
+            vocab (Vocab): Vocabulary to extend, a new one by default.
+        """
+        self.fields = tuple(fields)
+        self.vocab = vocab if vocab is not None else Vocab()
+        self._docs: Dict[str, List[List[int]]] = {field: [] for field in self.fields}
+        self._parts: Dict[str, List[TokenIds]] = {field: [] for field in self.fields}
+
+    # documents kept as python lists before they are packed into arrays
+    FLUSH_EVERY = 10_000
+
+    def add(self, processed: Dict[str, List[str]]) -> None:
+        for field in self.fields:
+            self._docs[field].append(self.vocab.encode(processed.get(field, ())))
+        if len(self._docs[self.fields[0]]) >= self.FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self) -> None:
+        for field in self.fields:
+            if self._docs[field]:
+                self._parts[field].append(TokenIds.from_lists(self._docs[field]))
+                self._docs[field] = []
+
+    def build(self) -> Dict[str, TokenIds]:
+        self._flush()
+        return {field: TokenIds.concatenate(parts) for field, parts in self._parts.items()}
+
+    def merge(self, tokens: Sequence[str], token_ids: Dict[str, TokenIds]) -> None:
+        """Append documents encoded with another vocabulary (e.g. in a worker process), ids are remapped."""
+        self._flush()
+        remap = np.array([self.vocab.add(token) for token in tokens], dtype=np.int32)
+        for field in self.fields:
+            self._parts[field].append(TokenIds(token_ids[field].indptr, remap[token_ids[field].ids]))
+
+    def save(self, jsonl_path: Union[str, Path]) -> None:
+        """Save the vocabulary and one array file per field next to the JSONL file."""
+        self.vocab.save(vocab_path(jsonl_path))
+        for field, token_ids in self.build().items():
+            token_ids.save(token_ids_path(jsonl_path, field))
+
+
+def take_token_ids(src_jsonl: Union[str, Path], dst_jsonl: Union[str, Path], rows: Sequence[int]) -> List[str]:
+    """
+    Keep token ids of a JSONL file aligned with a row subset of it written to another file.
+
+    Args:
+        src_jsonl (Union[str, Path]): JSONL file with token ids saved next to it.
+        dst_jsonl (Union[str, Path]): JSONL file with the kept rows.
+        rows (Sequence[int]): Kept rows of src_jsonl in the order of dst_jsonl.
+
+    Returns:
+        List[str]: Fields that were copied, empty if src_jsonl has no token ids.
+    """
+    src_jsonl, dst_jsonl = Path(src_jsonl), Path(dst_jsonl)
+    if not vocab_path(src_jsonl).exists():
+        return []
+    # ids stay valid, the vocabulary is shared as is
+    shutil.copyfile(vocab_path(src_jsonl), vocab_path(dst_jsonl))
+    fields = []
+    for path in src_jsonl.parent.glob(f"{src_jsonl.stem}.*.npz"):
+        field = path.name[len(src_jsonl.stem) + 1 : -len(".npz")]
+        TokenIds.load(path).take(rows).save(token_ids_path(dst_jsonl, field))
+        fields.append(field)
+    return fields
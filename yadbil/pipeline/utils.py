@@ -1,11 +1,14 @@
-from yadbil.data.filtering import FILTER_STEPS
-from yadbil.data.mining.telegram import TELEGRAM_STEPS
-from yadbil.data.processing import TEXT_STEPS
 from yadbil.pipeline.creds import CREDS
-from yadbil.search import SEARCH_STEPS
+from yadbil.utils.lazy import LazyRegistry
 
 
-ALL_STEPS = [*TELEGRAM_STEPS, *TEXT_STEPS, *SEARCH_STEPS, *FILTER_STEPS]
-
-STEPS_MAPPING = {step.__name__: step for step in ALL_STEPS}
+# step groups of the packages, a step module (and its third-party deps) is imported only when the step is used
+STEPS_MAPPING = LazyRegistry.from_groups(
+    {
+        "yadbil.data.mining.telegram": "TELEGRAM_STEPS",
+        "yadbil.data.processing": "TEXT_STEPS",
+        "yadbil.search": "SEARCH_STEPS",
+        "yadbil.data.filtering": "FILTER_STEPS",
+    }
+)
 CREDS_MAPPING = {creds.__name__: creds for creds in CREDS}
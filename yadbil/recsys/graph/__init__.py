@@ -1,3 +1,4 @@
-from yadbil.recsys.graph.algorithm import find_similar_posts_pagerank
+from yadbil.recsys.graph.algorithm import PageRankRecommender, find_similar_posts_pagerank
 from yadbil.recsys.graph.graph import GraphProcessor
+from yadbil.recsys.graph.io import BinaryGraph, convert_graphml_to_binary, load_graph_binary, save_graph_binary
 from yadbil.recsys.graph.visualization import get_graph_plot
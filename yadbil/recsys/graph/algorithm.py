@@ -1,4 +1,11 @@
+from collections import deque
+from typing import Any, Hashable, List, Tuple, Union
+
 import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from yadbil.recsys.graph.io import BinaryGraph
 
 
 def find_similar_posts_pagerank(G, post_id, top_n=5):
@@ -25,3 +32,172 @@ def find_similar_posts_pagerank(G, post_id, top_n=5):
 
     # Exclude the original node and return the top_n
     return [(node, score) for node, score in similar_posts if node != post_id][:top_n]
+
+
+class PageRankRecommender:
+    def __init__(
+        self,
+        G: Union[nx.Graph, BinaryGraph],
+        alpha: float = 0.85,
+        weight: str = "weight",
+        max_iter: int = 100,
+        tol: float = 1e-6,
+    ):
+        """Personalized PageRank over a graph converted once into a CSR transition matrix.
+
+        Scores follow nx.pagerank semantics: dangling nodes (no outgoing weight)
+        teleport back to the seed, convergence is checked with the l1 norm.
+
+        Args:
+            G (Union[nx.Graph, BinaryGraph]): The graph of posts, binary graphs are used without conversion.
+            alpha (float): Damping parameter. Defaults to 0.85.
+            weight (str): Edge attribute used as weight. Defaults to 'weight'.
+            max_iter (int): Max number of power iterations. Defaults to 100.
+            tol (float): Error tolerance used to check convergence. Defaults to 1e-6.
+        """
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.tol = tol
+
+        if isinstance(G, BinaryGraph):
+            self.nodes = list(G.nodes)
+            adjacency = G.to_csr()
+        else:
+            self.nodes = list(G)
+            adjacency = sparse.csr_matrix(nx.to_scipy_sparse_array(G, nodelist=self.nodes, weight=weight, dtype=float))
+        self.node_to_idx = {node: i for i, node in enumerate(self.nodes)}
+
+        out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+        inv_out_weight = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight != 0)
+        # row-stochastic transition matrix, rows of dangling nodes are empty
+        self.transition = sparse.csr_matrix(sparse.diags(inv_out_weight) @ adjacency)
+        self.transition_t = self.transition.T.tocsr()
+        self.is_dangling = out_weight == 0
+
+    def _top_n(
+        self,
+        node_idx: np.ndarray,
+        scores: np.ndarray,
+        seed_idx: int,
+        top_n: int,
+    ) -> List[Tuple[Hashable, float]]:
+        scores = np.where(node_idx == seed_idx, -np.inf, scores)
+        top_n = min(top_n, len(scores) - int((node_idx == seed_idx).any()))
+        if top_n <= 0:
+            return []
+        top = np.argpartition(scores, -top_n)[-top_n:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.nodes[node_idx[i]], float(scores[i])) for i in top]
+
+    def pagerank_batch(self, post_ids: List[Any]) -> np.ndarray:
+        """Runs personalized PageRank for many seeds at once with vectorized power iteration.
+
+        Args:
+            post_ids (List[Any]): Seed node ids.
+
+        Returns:
+            np.ndarray: Scores of shape (len(post_ids), n_nodes), rows follow post_ids order.
+        """
+        n_nodes = len(self.nodes)
+        seeds = np.array([self.node_to_idx[post_id] for post_id in post_ids], dtype=np.int64)
+        rows = np.arange(len(seeds))
+
+        x = np.full((len(seeds), n_nodes), 1.0 / n_nodes)
+        active = np.ones(len(seeds), dtype=bool)
+        for _ in range(self.max_iter):
+            idx = np.flatnonzero(active)
+            x_last = x[idx]
+            # (transition.T @ x.T).T, one sparse-dense product for all active seeds
+            x_new = self.alpha * (self.transition_t @ x_last.T).T
+            x_new[rows[: len(idx)], seeds[idx]] += (
+                self.alpha * x_last[:, self.is_dangling].sum(axis=1) + 1 - self.alpha
+            )
+            x[idx] = x_new
+            # converged rows are frozen, so each seed stops exactly where nx.pagerank would
+            active[idx] = np.abs(x_new - x_last).sum(axis=1) >= n_nodes * self.tol
+            if not active.any():
+                return x
+        raise nx.PowerIterationFailedConvergence(self.max_iter)
+
+    def pagerank_push(self, post_id: Any, eps: float = 1e-4) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximates personalized PageRank with local forward push.
+
+        Only nodes reachable with residual above eps per unit of degree are touched,
+        so the cost depends on the seed's neighborhood rather than on the graph size.
+
+        Args:
+            post_id (Any): Seed node id.
+            eps (float): Residual threshold, lower is more accurate. Defaults to 1e-4.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Indices of touched nodes and their approximate scores.
+        """
+        indptr, indices, data = self.transition.indptr, self.transition.indices, self.transition.data
+        seed = self.node_to_idx[post_id]
+
+        estimate = {}
+        residual = {seed: 1.0}
+        queue = deque([seed])
+        in_queue = {seed}
+        while queue:
+            u = queue.popleft()
+            in_queue.discard(u)
+            r_u = residual.pop(u)
+
+            estimate[u] = estimate.get(u, 0.0) + (1 - self.alpha) * r_u
+            pushed = self.alpha * r_u
+            if self.is_dangling[u]:
+                targets, shares = (seed,), (pushed,)
+            else:
+                start, end = indptr[u], indptr[u + 1]
+                targets, shares = indices[start:end].tolist(), (pushed * data[start:end]).tolist()
+
+            for v, share in zip(targets, shares):
+                residual[v] = residual.get(v, 0.0) + share
+                if v not in in_queue and residual[v] > eps * max(indptr[v + 1] - indptr[v], 1):
+                    queue.append(v)
+                    in_queue.add(v)
+
+        nodes = np.fromiter(estimate.keys(), dtype=np.int64, count=len(estimate))
+        scores = np.fromiter(estimate.values(), dtype=np.float64, count=len(estimate))
+        return nodes, scores
+
+    def recommend(
+        self,
+        post_id: Any,
+        top_n: int = 5,
+        method: str = "power",
+        eps: float = 1e-4,
+    ) -> List[Tuple[Hashable, float]]:
+        """Finds similar posts using personalized PageRank.
+
+        Args:
+            post_id (Any): The ID of the post to find similarities for.
+            top_n (int): The number of similar posts to return.
+            method (str): 'power' for exact power iteration, 'push' for local forward push.
+            eps (float): Residual threshold for the 'push' method.
+
+        Returns:
+            List[Tuple[Hashable, float]]: (post ID, score) pairs sorted by score, without the original post.
+        """
+        if method == "power":
+            return self.recommend_batch([post_id], top_n)[0]
+        elif method == "push":
+            nodes, scores = self.pagerank_push(post_id, eps=eps)
+            return self._top_n(nodes, scores, self.node_to_idx[post_id], top_n)
+        else:
+            raise ValueError(f"Unknown method: {method}. Use 'power' or 'push'.")
+
+    def recommend_batch(self, post_ids: List[Any], top_n: int = 5) -> List[List[Tuple[Hashable, float]]]:
+        """Finds similar posts for many seeds with a single batched power iteration.
+
+        Args:
+            post_ids (List[Any]): The IDs of the posts to find similarities for.
+            top_n (int): The number of similar posts to return per seed.
+
+        Returns:
+            List[List[Tuple[Hashable, float]]]: Recommendations per seed, same format as recommend.
+        """
+        scores = self.pagerank_batch(post_ids)
+        node_idx = np.arange(len(self.nodes))
+        return [self._top_n(node_idx, row, self.node_to_idx[post_id], top_n) for row, post_id in zip(scores, post_ids)]
@@ -1,6 +1,10 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from yadbil.data.processing.text.utils.vocab import TokenIds, Vocab
 
 
 class GraphProcessor:
@@ -9,6 +13,10 @@ class GraphProcessor:
         posts: List[Dict[str, Any]],
         idf_scores: Dict[str, float],
         words_key: str = "stemmed_words",
+        max_df: Optional[int] = None,
+        chunk_size: int = 1024,
+        token_ids: Optional[TokenIds] = None,
+        vocab: Optional[Vocab] = None,
     ):
         """Initializes the GraphProcessor with posts and IDF scores.
 
@@ -16,15 +24,66 @@ class GraphProcessor:
             posts (List[Dict[str, Any]]): The list of posts.
             idf_scores (Dict[str, float]): The IDF scores for words.
             words_key (str): The key to access words in posts. Defaults to 'stemmed_words'.
+            max_df (Optional[int]): Words present in more posts than this are ignored,
+                they neither create edges nor add to edge weights. Defaults to None (no cap).
+            chunk_size (int): Number of posts per block of the sparse product, bounds peak memory.
+            token_ids (Optional[TokenIds]): Token ids of words_key aligned with posts (saved by TextProcessor),
+                the post-term matrix is then built from arrays without hashing words.
+            vocab (Optional[Vocab]): Vocabulary of token_ids, required with them.
         """
         self.posts = posts
         self.idf_scores = idf_scores
         self.words_key = words_key
+        self.max_df = max_df
+        self.chunk_size = chunk_size
+        self.token_ids = token_ids
+        self.vocab = vocab
         self.G = self._create_graph()
 
+    def _doc_term_matrix(self) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Builds a binary post-term matrix and the IDF vector aligned with its columns.
+
+        Returns:
+            Tuple[sparse.csr_matrix, np.ndarray]: Matrix of shape (n_posts, n_words) and IDF per column.
+        """
+        if self.token_ids is not None:
+            # copies, csr_matrix wraps the arrays and sum_duplicates sorts them in place
+            doc_term = sparse.csr_matrix(
+                (np.ones(len(self.token_ids.ids)), self.token_ids.ids.copy(), self.token_ids.indptr.copy()),
+                shape=(len(self.token_ids), len(self.vocab)),
+            )
+            # repeated words of a post are summed, the matrix is binary
+            doc_term.sum_duplicates()
+            doc_term.data[:] = 1
+            vocab = self.vocab.tokens
+        else:
+            vocab = {}
+            indices = []
+            indptr = [0]
+            for post in self.posts:
+                for word in set(post[self.words_key]):
+                    indices.append(vocab.setdefault(word, len(vocab)))
+                indptr.append(len(indices))
+
+            doc_term = sparse.csr_matrix(
+                (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                shape=(len(self.posts), len(vocab)),
+            )
+        idf = np.array([self.idf_scores.get(word, 0) for word in vocab], dtype=np.float64)
+
+        if self.max_df is not None:
+            keep = np.flatnonzero(doc_term.getnnz(axis=0) <= self.max_df)
+            doc_term = doc_term[:, keep]
+            idf = idf[keep]
+
+        return doc_term, idf
+
     def _create_graph(self) -> nx.Graph:
         """Creates an undirected graph based on the posts and IDF scores.
 
+        Candidate pairs come only from shared words: the binary post-term matrix B is multiplied
+        by its transpose, B @ B.T gives shared word counts and B @ diag(idf) @ B.T gives edge weights.
+
         Returns:
             nx.Graph: The created graph.
         """
@@ -34,13 +93,33 @@ class GraphProcessor:
         for post in self.posts:
             G.add_node(post["id"], words=post[self.words_key])
 
-        # Adding edges based on shared stemmed words
-        for i, post1 in enumerate(self.posts):
-            for post2 in self.posts[i + 1 :]:
-                common_words = set(post1[self.words_key]) & set(post2[self.words_key])
-                if common_words:
-                    edge_weight = sum(self.idf_scores.get(word, 0) for word in common_words)
-                    G.add_edge(post1["id"], post2["id"], weight=edge_weight)
+        doc_term, idf = self._doc_term_matrix()
+        doc_term_t = doc_term.T.tocsr()
+        weighted_t = doc_term.multiply(idf).T.tocsr()
+        n_posts = doc_term.shape[0]
+
+        # Adding edges based on shared stemmed words, block by block to bound the product size
+        for start in range(0, n_posts, self.chunk_size):
+            block = doc_term[start : start + self.chunk_size]
+            shared = sparse.triu(block @ doc_term_t, k=start + 1).tocoo()
+            if not shared.nnz:
+                continue
+            weights = sparse.triu(block @ weighted_t, k=start + 1).tocoo()
+
+            # weight product drops zero sums, so align it to the shared-words structure by linear keys
+            shared_keys = shared.row.astype(np.int64) * n_posts + shared.col
+            order = np.argsort(shared_keys)
+            shared_keys = shared_keys[order]
+            edge_weights = np.zeros(len(shared_keys))
+            weight_keys = weights.row.astype(np.int64) * n_posts + weights.col
+            edge_weights[np.searchsorted(shared_keys, weight_keys)] = weights.data
+
+            rows = shared.row[order] + start
+            cols = shared.col[order]
+            G.add_weighted_edges_from(
+                (self.posts[i]["id"], self.posts[j]["id"], w)
+                for i, j, w in zip(rows.tolist(), cols.tolist(), edge_weights.tolist())
+            )
 
         return G
 
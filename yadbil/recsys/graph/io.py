@@ -1,9 +1,129 @@
 import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Hashable, List, Union
 
 import networkx as nx
+import numpy as np
+from scipy import sparse
 
 
-def load_resources(graph_path, posts_path, posts_view_path):
+# binary graph layout, one directory per graph:
+#   indptr.npy, indices.npy, weights.npy - symmetric CSR adjacency in nodes.json order
+#   nodes.json                           - node ids, loaded as str like the ids of GraphML files
+#   words_vocab.json                     - distinct words of all nodes
+#   words_indptr.npy, words_ids.npy      - per-node word lists as offsets into a flat array of vocab ids
+@dataclass
+class BinaryGraph:
+    nodes: List[Hashable]
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    vocab: List[str]
+    words_indptr: np.ndarray
+    words_ids: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def words(self, node_idx: int) -> List[str]:
+        ids = self.words_ids[self.words_indptr[node_idx] : self.words_indptr[node_idx + 1]]
+        return [self.vocab[i] for i in ids]
+
+    def to_csr(self) -> sparse.csr_matrix:
+        # no copy, arrays stay memory-mapped
+        return sparse.csr_matrix((self.weights, self.indices, self.indptr), shape=(len(self), len(self)))
+
+    def to_networkx(self) -> nx.Graph:
+        G = nx.Graph()
+        for i, node in enumerate(self.nodes):
+            G.add_node(node, words=self.words(i))
+        coo = sparse.triu(self.to_csr()).tocoo()
+        G.add_weighted_edges_from(
+            (self.nodes[u], self.nodes[v], w) for u, v, w in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())
+        )
+        return G
+
+
+def save_graph_binary(G: nx.Graph, path: Union[str, Path], weight: str = "weight", words_key: str = "words") -> None:
+    """Save an undirected graph in the binary CSR layout.
+
+    Args:
+        G (nx.Graph): The graph of posts.
+        path (Union[str, Path]): Output directory.
+        weight (str): Edge attribute with weights. Missing weights are saved as 1.
+        words_key (str): Node attribute with the list of words.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    nodes = list(G)
+    node_to_idx = {node: i for i, node in enumerate(nodes)}
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    vocab = {}
+    words_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    words_ids = []
+    for i, (node, neighbors) in enumerate(G.adjacency()):
+        for neighbor, data in neighbors.items():
+            indices.append(node_to_idx[neighbor])
+            weights.append(data.get(weight, 1.0))
+        indptr[i + 1] = len(indices)
+
+        for word in G.nodes[node].get(words_key, []):
+            words_ids.append(vocab.setdefault(word, len(vocab)))
+        words_indptr[i + 1] = len(words_ids)
+
+    # csr expects sorted column indices within a row
+    csr = sparse.csr_matrix(
+        (np.array(weights, dtype=np.float64), np.array(indices, dtype=np.int32), indptr),
+        shape=(len(nodes), len(nodes)),
+    )
+    csr.has_sorted_indices = False
+    csr.sort_indices()
+
+    np.save(path / "indptr.npy", csr.indptr.astype(np.int64))
+    np.save(path / "indices.npy", csr.indices.astype(np.int32))
+    np.save(path / "weights.npy", csr.data)
+    np.save(path / "words_indptr.npy", words_indptr)
+    np.save(path / "words_ids.npy", np.array(words_ids, dtype=np.int32))
+    with open(path / "nodes.json", "w") as f:
+        json.dump(nodes, f, ensure_ascii=False)
+    with open(path / "words_vocab.json", "w") as f:
+        json.dump(list(vocab), f, ensure_ascii=False)
+
+
+def load_graph_binary(path: Union[str, Path], mmap: bool = True) -> BinaryGraph:
+    """Load a graph saved with save_graph_binary.
+
+    Args:
+        path (Union[str, Path]): Graph directory.
+        mmap (bool): Memory-map the arrays, so several processes share the same pages.
+
+    Returns:
+        BinaryGraph: The loaded graph.
+    """
+    path = Path(path)
+    mmap_mode = "r" if mmap else None
+    with open(path / "nodes.json") as f:
+        # graphs built in memory have int post ids, GraphML always gives str ones, the UI looks nodes up by str
+        nodes = [str(node) for node in json.load(f)]
+    with open(path / "words_vocab.json") as f:
+        vocab = json.load(f)
+    return BinaryGraph(
+        nodes=nodes,
+        indptr=np.load(path / "indptr.npy", mmap_mode=mmap_mode),
+        indices=np.load(path / "indices.npy", mmap_mode=mmap_mode),
+        weights=np.load(path / "weights.npy", mmap_mode=mmap_mode),
+        vocab=vocab,
+        words_indptr=np.load(path / "words_indptr.npy", mmap_mode=mmap_mode),
+        words_ids=np.load(path / "words_ids.npy", mmap_mode=mmap_mode),
+    )
+
+
+def read_graphml(graph_path: Union[str, Path]) -> nx.Graph:
     # Load the graph
     G = nx.read_graphml(graph_path)
 
@@ -16,6 +136,20 @@ def load_resources(graph_path, posts_path, posts_view_path):
             except json.JSONDecodeError:
                 # In case the value is not a JSON string, keep it as is
                 pass
+    return G
+
+
+def convert_graphml_to_binary(graph_path: Union[str, Path], output_path: Union[str, Path], **kwargs: Any) -> None:
+    """Convert an existing GraphML file (with JSON encoded node attributes) to the binary layout."""
+    save_graph_binary(read_graphml(graph_path), output_path, **kwargs)
+
+
+def load_resources(graph_path, posts_path, posts_view_path):
+    # directory means binary layout, otherwise GraphML
+    if Path(graph_path).is_dir():
+        G = load_graph_binary(graph_path)
+    else:
+        G = read_graphml(graph_path)
 
     # Assuming loading posts and posts_view as before
     with open(posts_path) as f:
@@ -1,10 +1,18 @@
-from yadbil.search.bm25 import BM25
-from yadbil.search.fasttext import FastTextWrapper
-from yadbil.search.openai import OpenAISearch
-from yadbil.search.pinecone import PineconeSearch
-from yadbil.search.word2vec import Word2VecWrapper
+from yadbil.utils.lazy import lazy_getattr
 
 
-SEARCH_EMB_STEPS = [FastTextWrapper, Word2VecWrapper, OpenAISearch, PineconeSearch]
-
-SEARCH_STEPS = [BM25, *SEARCH_EMB_STEPS]
+# step modules pull in heavy clients (gensim, openai, pinecone), they are imported on first access
+__getattr__ = lazy_getattr(
+    __name__,
+    attrs={
+        "BM25": "yadbil.search.bm25",
+        "FastTextWrapper": "yadbil.search.fasttext",
+        "OpenAISearch": "yadbil.search.openai",
+        "PineconeSearch": "yadbil.search.pinecone",
+        "Word2VecWrapper": "yadbil.search.word2vec",
+    },
+    groups={
+        "SEARCH_EMB_STEPS": ["FastTextWrapper", "Word2VecWrapper", "OpenAISearch", "PineconeSearch"],
+        "SEARCH_STEPS": ["BM25", "FastTextWrapper", "Word2VecWrapper", "OpenAISearch", "PineconeSearch"],
+    },
+)
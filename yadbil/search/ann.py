@@ -0,0 +1,183 @@
+import argparse
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def top_n_by_score(scores: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the n highest scores sorted in descending order, n is clipped to the number of scores."""
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.array([], dtype=np.int64)
+    top_n = np.argpartition(scores, -n)[-n:]
+    return top_n[np.argsort(scores[top_n])[::-1]]
+
+
+class IVFIndex:
+    INDEX_FILE_NAME = "ivf_index.npz"
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        n_iter: int = 10,
+        max_train_size: int = 64,
+        chunk_size: int = 65536,
+        seed: int = 42,
+    ):
+        """Inverted file index for inner product search over normalized embeddings.
+
+        A spherical k-means coarse quantizer splits the table into n_lists cells,
+        a query is scored exactly only against rows of the nprobe closest cells.
+
+        Args:
+            n_lists: Number of cells, defaults to 4 * sqrt(n_rows).
+            nprobe: Default number of cells visited per query, more is slower but more accurate.
+            n_iter: Number of k-means iterations.
+            max_train_size: Max number of training rows per cell, k-means runs on a sample above that.
+            chunk_size: Rows assigned to cells at once, bounds the memory of the score matrix.
+            seed: Random seed for sampling and initialization.
+        """
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.max_train_size = max_train_size
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+        self.centroids = None
+        self.list_indptr = None
+        self.list_ids = None
+
+    def _assign(self, emb_table: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignment = np.empty(len(emb_table), dtype=np.int64)
+        for start in range(0, len(emb_table), self.chunk_size):
+            chunk = np.asarray(emb_table[start : start + self.chunk_size], dtype=np.float32)
+            assignment[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    def _normalize(self, x: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(x, axis=1, keepdims=True)
+        return np.divide(x, norm, out=np.zeros_like(x), where=norm != 0)
+
+    def fit(self, emb_table: np.ndarray) -> "IVFIndex":
+        rng = np.random.default_rng(self.seed)
+        n_rows = len(emb_table)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(n_rows)))
+        self.n_lists = n_lists = min(n_lists, n_rows)
+
+        train_size = min(n_rows, n_lists * self.max_train_size)
+        train = np.asarray(emb_table[np.sort(rng.choice(n_rows, train_size, replace=False))], dtype=np.float32)
+
+        centroids = train[rng.choice(train_size, n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignment = self._assign(train, centroids)
+            order = np.argsort(assignment, kind="stable")
+            counts = np.bincount(assignment, minlength=n_lists)
+            non_empty = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[non_empty] = np.add.reduceat(train[order], np.cumsum(counts)[non_empty] - counts[non_empty], axis=0)
+            # re-seed empty cells with random training rows
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = train[rng.choice(train_size, len(empty), replace=False)]
+            centroids = self._normalize(sums)
+
+        assignment = self._assign(emb_table, centroids)
+        self.centroids = centroids
+        self.list_ids = np.argsort(assignment, kind="stable")
+        self.list_indptr = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+        return self
+
+    def search(
+        self,
+        emb_table: np.ndarray,
+        query: np.ndarray,
+        n: int = 10,
+        nprobe: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Approximate top n rows of emb_table by inner product with query.
+
+        Returns:
+            A tuple of row ids and their scores, sorted by score in descending order.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        cells = top_n_by_score(self.centroids @ query.astype(np.float32), nprobe)
+        candidates = np.concatenate([self.list_ids[self.list_indptr[c] : self.list_indptr[c + 1]] for c in cells])
+        candidates.sort()  # sequential reads from emb_table
+
+        scores = np.dot(emb_table[candidates], query)
+        top_n = top_n_by_score(scores, n)
+        return candidates[top_n], scores[top_n]
+
+    def save(self, path: Union[str, Path]) -> None:
+        np.savez(
+            Path(path) / self.INDEX_FILE_NAME,
+            centroids=self.centroids,
+            list_indptr=self.list_indptr,
+            list_ids=self.list_ids,
+            nprobe=self.nprobe,
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["IVFIndex"]:
+        """Load an index saved in the path directory, None if there is no index."""
+        path = Path(path) / cls.INDEX_FILE_NAME
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            inst = cls(n_lists=len(data["centroids"]), nprobe=int(data["nprobe"]))
+            inst.centroids = data["centroids"]
+            inst.list_indptr = data["list_indptr"]
+            inst.list_ids = data["list_ids"]
+        return inst
+
+
+def recall_latency_benchmark(
+    index: IVFIndex,
+    emb_table: np.ndarray,
+    queries: np.ndarray,
+    n: int = 10,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32, 64),
+) -> list[dict[str, Any]]:
+    """Measure recall@n and mean latency of the index against exact search for several nprobe values.
+
+    Returns:
+        A list of dicts with nprobe (0 stands for exact search), recall and latency_ms.
+    """
+    t0 = perf_counter()
+    exact = [set(top_n_by_score(np.dot(emb_table, q), n).tolist()) for q in queries]
+    results = [{"nprobe": 0, "recall": 1.0, "latency_ms": (perf_counter() - t0) / len(queries) * 1000}]
+
+    for nprobe in nprobes:
+        t0 = perf_counter()
+        found = [index.search(emb_table, q, n=n, nprobe=nprobe)[0] for q in queries]
+        latency = (perf_counter() - t0) / len(queries) * 1000
+        recall = np.mean([len(expected.intersection(f.tolist())) / len(expected) for expected, f in zip(exact, found)])
+        results.append({"nprobe": nprobe, "recall": float(recall), "latency_ms": latency})
+
+    for res in results:
+        logger.info(f"nprobe={res['nprobe']:>4} recall@{n}={res['recall']:.4f} latency={res['latency_ms']:.3f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of IVF index against exact search.")
+    parser.add_argument(
+        "--emb_table_path", type=Path, help="Path to emb_table.npy, index is loaded from the same dir."
+    )
+    parser.add_argument("--n_queries", type=int, default=200, help="Number of table rows used as queries.")
+    parser.add_argument("--n", type=int, default=10, help="Number of results per query.")
+    args = parser.parse_args()
+
+    emb_table = np.load(args.emb_table_path, mmap_mode="r")
+    index = IVFIndex.load(args.emb_table_path.parent) or IVFIndex().fit(emb_table)
+    rng = np.random.default_rng(0)
+    queries = np.asarray(emb_table[rng.choice(len(emb_table), min(args.n_queries, len(emb_table)), replace=False)])
+    recall_latency_benchmark(index, emb_table, queries, n=args.n)
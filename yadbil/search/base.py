@@ -1,17 +1,29 @@
-import json
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 import numpy as np
-from gensim.models import KeyedVectors
-from gensim.models.word2vec import Word2Vec
 from tqdm.auto import tqdm
 
-from yadbil.utils.data_handling import JsonCorpus, get_dict_field
+from yadbil.search.ann import IVFIndex, top_n_by_score
+from yadbil.search.filters import PostingFilter
+from yadbil.search.generations import IndexGenerations, resolve_generation
+from yadbil.search.storage import (
+    full_table_path,
+    load_emb_table,
+    save_compact_emb_table,
+    truncate_and_normalize,
+)
+from yadbil.utils.data_handling import JsonCorpus, get_dict_field, read_records
 from yadbil.utils.logger import get_logger
 
 
+if TYPE_CHECKING:
+    # gensim is imported by the word embedding steps, not by every search step
+    from gensim.models import KeyedVectors
+    from gensim.models.word2vec import Word2Vec
+
+
 logger = get_logger(__name__)
 
 
@@ -40,6 +52,20 @@ class BaseSearch(ABC):
         """
         pass
 
+    def query_batch(self, queries: list[Any], n: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Perform many search queries and return the top n results for each.
+
+        Args:
+            queries: A list of processed query objects.
+            n: Number of top results to return per query.
+
+        Returns:
+            A tuple of result IDs and scores, both of shape (len(queries), n).
+        """
+        results = [self.query(query, n=n) for query in queries]
+        return np.array([ids for ids, _ in results]), np.array([scores for _, scores in results])
+
     @abstractmethod
     def run(self, data: Optional[list[list[str]]] = None) -> None:
         """
@@ -52,48 +78,294 @@ class BaseSearch(ABC):
 
 
 class BaseEmbeddingSearch(BaseSearch, ABC):
+    # max queries embedded at once by query_batch, steps backed by an API set it to the request limit
+    max_query_batch: Optional[int] = None
+
     @abstractmethod
     def _embed_and_normalize_query(self, query) -> np.ndarray:
         pass
 
-    def query(self, query, n: int = 10, filtered_ids=None) -> tuple[list[int], list[float]]:
-        query = self._embed_and_normalize_query(query)
+    def _init_index_extras(
+        self,
+        ann_params: Optional[dict[str, Any]] = None,
+        filter_params: Optional[dict[str, Any]] = None,
+        storage_params: Optional[dict[str, Any]] = None,
+        incremental_params: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """
+        Args:
+            ann_params: IVFIndex params, index is built only if they are provided.
+            filter_params: PostingFilter params, filters are built from records only if they are provided.
+            storage_params: Table storage options:
+                dtype - None, 'float16' or 'int8', compact table is saved next to the float one and used for queries,
+                mmap - open tables with mmap_mode='r',
+                reduced_dim - keep only the renormalized prefix of matryoshka embeddings in the table,
+                    full vectors are saved next to it for rescoring,
+                rescore - rescore top candidates with the float (or full-dimensional) table,
+                rescore_factor - number of candidates per requested result for rescoring.
+            incremental_params: If provided, run writes index generations into output_path and embeds only records
+                with new uids: uid_field (default 'uid') and IndexGenerations params (keep_generations, compact_every).
+        """
+        self.ann_params = ann_params
+        self.ann_index = None
+        self.filter_params = filter_params
+        self.posting_filter = None
+        self.storage_params = storage_params or {}
+        self.rescore_table = None
+        self.full_emb_table = None
+        self.incremental_params = incremental_params
+
+    def _reduce_emb_table(self) -> None:
+        """Swap the table for its reduced prefix, the full one is kept until saving."""
+        reduced_dim = self.storage_params.get("reduced_dim")
+        if reduced_dim is not None:
+            self.full_emb_table = np.asarray(self.emb_table)
+            self.emb_table = truncate_and_normalize(self.full_emb_table, reduced_dim)
+
+    def _reduce_query(self, query: np.ndarray) -> np.ndarray:
+        reduced_dim = self.storage_params.get("reduced_dim")
+        return query if reduced_dim is None else truncate_and_normalize(query, reduced_dim)
+
+    def _save_index_extras(self, output_path: Path) -> None:
+        if self.full_emb_table is not None:
+            np.save(full_table_path(output_path / "emb_table.npy"), self.full_emb_table)
+        if self.storage_params.get("dtype") is not None:
+            save_compact_emb_table(output_path / "emb_table.npy", self.emb_table, self.storage_params["dtype"])
+        if self.ann_index is not None:
+            self.ann_index.save(output_path)
+        if self.posting_filter is not None:
+            self.posting_filter.save(output_path)
+
+    def _load_index_extras(self, data_path: Union[str, Path]) -> None:
+        """Load the table from data_path (or its compact version) with ann index and filters saved next to it."""
+        data_path = resolve_generation(data_path)
+        dtype = self.storage_params.get("dtype")
+        mmap = self.storage_params.get("mmap", False)
+        self.emb_table = load_emb_table(data_path, dtype=dtype, mmap=mmap)
+        # float table for rescoring is always mapped, only rows of top candidates are read
+        if self.storage_params.get("rescore", False):
+            if self.storage_params.get("reduced_dim") is not None:
+                self.rescore_table = load_emb_table(full_table_path(data_path), mmap=True)
+            elif dtype is not None:
+                self.rescore_table = load_emb_table(data_path, mmap=True)
+        self.ann_index = IVFIndex.load(Path(data_path).parent)
+        self.posting_filter = PostingFilter.load(Path(data_path).parent)
+
+    def _rescore(self, query: np.ndarray, ids: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+        ids = np.sort(ids)  # sequential reads from the mapped table
+        scores = np.dot(self.rescore_table[ids], query)
+        top_n = top_n_by_score(scores, n)
+        return ids[top_n], scores[top_n]
+
+    def _score_rows(self, query: np.ndarray, row_ids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Scores only the given rows without copying the whole subset of the table."""
+        # for wide filters scoring everything is cheaper than gathering rows
+        if len(row_ids) > len(self.emb_table) // 2:
+            return self.emb_table.dot(query)[row_ids]
+        scores = np.empty(len(row_ids))
+        for start in range(0, len(row_ids), chunk_size):
+            chunk = row_ids[start : start + chunk_size]
+            scores[start : start + len(chunk)] = np.dot(self.emb_table[chunk], query)
+        return scores
+
+    def query(
+        self,
+        query,
+        n: int = 10,
+        filtered_ids=None,
+        nprobe: int = None,
+        filters: dict[str, Any] = None,
+    ) -> tuple[list[int], list[float]]:
+        """
+        Args:
+            query: Raw query, embedded with _embed_and_normalize_query.
+            n: Number of top results, fewer are returned if fewer rows pass the filters.
+            filtered_ids: Explicit ids of allowed rows.
+            nprobe: Number of ANN cells to visit, only used with ANN index and no filters.
+            filters: Conditions for PostingFilter.select, e.g. {"channel": ["a"], "date_from": "2024-01-01"}.
+        """
+        full_query = np.asarray(self._embed_and_normalize_query(query))
+        query = self._reduce_query(full_query)
+
+        if filters:
+            if self.posting_filter is None:
+                raise ValueError("No posting filter available, set filter_params when building the index.")
+            selected = self.posting_filter.select(**filters)
+            filtered_ids = selected if filtered_ids is None else np.intersect1d(selected, filtered_ids)
 
-        filtered_ids = np.array(filtered_ids) if filtered_ids is not None else None
+        # compact or reduced tables return more candidates to be rescored with full float vectors
+        k = n if self.rescore_table is None else n * self.storage_params.get("rescore_factor", 4)
 
-        emb_table = self.emb_table if filtered_ids is None else self.emb_table[filtered_ids]
+        # ann index covers the whole table, filtered search stays exact
+        if self.ann_index is not None and filtered_ids is None:
+            top_n, scores = self.ann_index.search(self.emb_table, query, n=k, nprobe=nprobe)
+        else:
+            # emb_table must be normalized at creation time, don't want to do it here
+            if filtered_ids is None:
+                scores = self.emb_table.dot(query)
+            else:
+                filtered_ids = np.asarray(filtered_ids, dtype=np.int64)
+                scores = self._score_rows(query, filtered_ids)
+
+            top_n = top_n_by_score(scores, k)
+            scores = scores[top_n]
+
+            # reverse mapping to original ids
+            if filtered_ids is not None:
+                top_n = filtered_ids[top_n]
 
-        # emb_table must be normalized at creation time, don't want to do it here
-        scores = np.dot(emb_table, query)
+        if self.rescore_table is not None:
+            top_n, scores = self._rescore(full_query, top_n, n)
 
-        # is it really faster than argsort? or only for large n?
-        top_n = np.argpartition(scores, -n)[-n:]
-        top_n = sorted(top_n, key=lambda x: scores[x], reverse=True)
-        scores = scores[top_n]
+        return list(top_n), scores
 
-        # reverse mapping to original ids
-        if filtered_ids is not None:
-            top_n = list(filtered_ids[top_n])
+    def query_batch(
+        self,
+        queries: list[Any],
+        n: int = 10,
+        chunk_size: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Exact search for many queries with one matrix-matrix product per chunk of queries.
+        Searches the stored table only, without rescoring.
 
-        return top_n, scores
+        Args:
+            queries: A list of raw queries, embedded in bulk.
+            n: Number of top results to return per query, clipped to the table size.
+            chunk_size: Queries scored at once, by default the score matrix is kept around 32M floats.
+                Capped by max_query_batch.
+
+        Returns:
+            A tuple of result IDs and scores, both of shape (len(queries), n).
+        """
+        n = min(n, len(self.emb_table))
+        if n == 0:
+            # empty table (fresh index) or n=0, nothing to score
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float64)
+        chunk_size = chunk_size or max(1, 2**25 // len(self.emb_table))
+        if self.max_query_batch is not None:
+            chunk_size = min(chunk_size, self.max_query_batch)
+
+        ids = np.empty((len(queries), n), dtype=np.int64)
+        scores = np.empty((len(queries), n), dtype=np.float64)
+        for start in range(0, len(queries), chunk_size):
+            chunk = self._reduce_query(np.asarray(self._embed_query_batch(queries[start : start + chunk_size])))
+            chunk_scores = self.emb_table.dot(chunk.T).T
+
+            top_n = np.argpartition(chunk_scores, -n, axis=1)[:, -n:]
+            top_scores = np.take_along_axis(chunk_scores, top_n, axis=1)
+            order = np.argsort(top_scores, axis=1)[:, ::-1]
+
+            ids[start : start + len(chunk)] = np.take_along_axis(top_n, order, axis=1)
+            scores[start : start + len(chunk)] = np.take_along_axis(top_scores, order, axis=1)
+        return ids, scores
 
     def run(self, data=None):
         if data is None:
             if self.input_path is None:
                 raise ValueError("No input data provided.")
-            with open(self.input_path, "r") as f:
-                data = [json.loads(line) for line in f]
+            data = read_records(self.input_path, columns=self._input_columns())
+
+        if self.incremental_params is not None:
+            self._run_incremental(data)
+            return
 
         if not self.is_pretrained:
             logger.info("Training embedding model...")
             self.train(data=data)
 
+        self._build_posting_filter(data)
         data = [get_dict_field(x, self.record_processed_data_key_list) for x in data]
-        self.emb_table = np.array(
-            [self._embed_and_normalize_query(x) for x in tqdm(data, desc="Embedding process...")]
-        )
+        self.emb_table = self._embed_table(data)
+        self._reduce_emb_table()
+        self._build_ann_index()
         self.save()
 
+    def _input_columns(self) -> list:
+        """Fields read from a columnar input, JSONL records are loaded whole."""
+        columns = [self.record_processed_data_key_list]
+        if self.incremental_params is not None:
+            columns.append(self.incremental_params.get("uid_field", "uid"))
+        if self.filter_params is not None:
+            posting_filter = PostingFilter(**self.filter_params)
+            columns.extend(posting_filter.fields)
+            if posting_filter.date_field is not None:
+                columns.append(posting_filter.date_field)
+        return columns
+
+    def _embed_query_batch(self, queries: list) -> np.ndarray:
+        """Embed a chunk of queries in query_batch."""
+        return self._embed_and_normalize_batch(queries)
+
+    def _embed_table(self, texts: list) -> np.ndarray:
+        """Embed documents at index time."""
+        return self._embed_and_normalize_batch(texts)
+
+    def _load_generation_model(self, generation: Path) -> None:
+        """Restore the trained model of a previous generation, new rows must be embedded by the same model."""
+        pass
+
+    def _run_incremental(self, records: list[dict[str, Any]]) -> None:
+        """Build the next index generation, rows of known uids are copied from the current one.
+
+        Rows follow the order of records, so row ids keep pointing to positions in the input file.
+        Every compact_every-th generation is rebuilt from scratch (with retraining for trained models).
+        """
+        params = dict(self.incremental_params)
+        uid_field = params.pop("uid_field", "uid")
+        generations = IndexGenerations(self.output_path, **params)
+        uids = [get_dict_field(record, [uid_field]) for record in records]
+        texts = [get_dict_field(record, self.record_processed_data_key_list) for record in records]
+
+        current = generations.current()
+        if generations.should_compact():
+            logger.info(f"Rebuilding index from scratch for {len(records)} records...")
+            if not self.is_pretrained:
+                self.train(data=records)
+            self.emb_table = self._embed_table(texts)
+        else:
+            if not self.is_pretrained:
+                self._load_generation_model(current)
+            old_rows = generations.match_uids(current, uids)
+            new = np.flatnonzero(old_rows < 0)
+            kept = np.flatnonzero(old_rows >= 0)
+            logger.info(f"Updating index: {len(new)} new of {len(records)} records, {len(kept)} rows reused")
+
+            # full vectors if the table was reduced, the prefix is taken again below
+            table_path = current / "emb_table.npy"
+            if full_table_path(table_path).exists():
+                table_path = full_table_path(table_path)
+            old_table = load_emb_table(table_path, mmap=True)
+            self.emb_table = np.empty((len(records), old_table.shape[1]), dtype=old_table.dtype)
+            self.emb_table[kept] = old_table[old_rows[kept]]
+            if len(new):
+                self.emb_table[new] = self._embed_table([texts[i] for i in new])
+
+        self._build_posting_filter(records)
+        self._reduce_emb_table()
+        self._build_ann_index()
+
+        output_path = self.output_path
+        with generations.stage(uids) as staged:
+            self.output_path = staged
+            try:
+                self.save()
+            finally:
+                self.output_path = output_path
+
+    def _build_ann_index(self) -> None:
+        if self.ann_params is not None:
+            logger.info("Building ANN index...")
+            self.ann_index = IVFIndex(**self.ann_params).fit(self.emb_table)
+
+    def _build_posting_filter(self, records: list[dict[str, Any]]) -> None:
+        if self.filter_params is not None:
+            logger.info("Building posting filters...")
+            self.posting_filter = PostingFilter(**self.filter_params).fit(records)
+
+    def _embed_and_normalize_batch(self, batch: list) -> np.ndarray:
+        return np.array([self._embed_and_normalize_query(x) for x in tqdm(batch, desc="Embedding process...")])
+
 
 # TODO: think about generalized load method
 class BaseWordEmbeddingSearch(BaseEmbeddingSearch, ABC):
@@ -104,6 +376,10 @@ class BaseWordEmbeddingSearch(BaseEmbeddingSearch, ABC):
         record_processed_data_key_list: list[str] = None,
         pretrained_emb_model_path: Union[str, Path] = None,
         model_params: dict[str, Any] = None,
+        ann_params: dict[str, Any] = None,
+        filter_params: dict[str, Any] = None,
+        storage_params: dict[str, Any] = None,
+        incremental_params: dict[str, Any] = None,
     ):
         self.input_path = input_path if isinstance(input_path, Path) or (input_path is None) else Path(input_path)
         self.output_path = output_path if isinstance(output_path, Path) or (output_path is None) else Path(output_path)
@@ -121,15 +397,17 @@ class BaseWordEmbeddingSearch(BaseEmbeddingSearch, ABC):
             self.is_pretrained = False
 
         self.emb_table = None
+        self._normed_vectors = None
+        self._init_index_extras(ann_params, filter_params, storage_params, incremental_params)
 
     @property
     @abstractmethod
-    def KeyedVectorsClass(self) -> type[KeyedVectors]:
+    def KeyedVectorsClass(self) -> "type[KeyedVectors]":
         pass
 
     @property
     @abstractmethod
-    def EmbeddingsClass(self) -> type[Word2Vec]:
+    def EmbeddingsClass(self) -> "type[Word2Vec]":
         pass
 
     @property
@@ -158,23 +436,89 @@ class BaseWordEmbeddingSearch(BaseEmbeddingSearch, ABC):
         except KeyError:
             return np.zeros(self.embeddings.vector_size)
 
-    # TODO: urgent, rework this messy OOV handling and normalization
-    def _embed_and_normalize_query(self, query: list[str]) -> np.ndarray:
-        if not query:
-            return np.zeros(self.embeddings.vector_size)
-        emb = [self._get_embedding(word) for word in query]
-        norm = [np.linalg.norm(x) for x in emb]
-        # TODO: handle zero division differently? is epsilon ok?
-        emb = np.mean([x / n if n != 0 else x for x, n in zip(emb, norm)], axis=0)
+    def _get_normed_vectors(self) -> np.ndarray:
+        """Unit-normalized copy of the vocabulary matrix, computed once per model."""
+        if self._normed_vectors is None:
+            vectors = self.embeddings.vectors
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._normed_vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms != 0)
+        return self._normed_vectors
+
+    def _get_normed_oov_embedding(self, word: str) -> np.ndarray:
+        # fasttext can still build a vector from char ngrams, w2v falls back to zeros
+        emb = self._get_embedding(word)
         norm = np.linalg.norm(emb)
-        emb = emb / norm if norm != 0 else emb
-        if np.isnan(emb).any():
-            emb = np.zeros(self.embeddings.vector_size)
-        return emb
+        return emb / norm if norm != 0 else emb
+
+    def _embed_and_normalize_query(self, query: list[str]) -> np.ndarray:
+        return self._embed_and_normalize_batch([query], show_progress=False)[0]
+
+    def _embed_and_normalize_batch(
+        self,
+        batch: list[list[str]],
+        chunk_size: int = 10000,
+        show_progress: bool = True,
+    ) -> np.ndarray:
+        """Embed documents as the normalized mean of their normalized word vectors.
+
+        Tokens are resolved to vocabulary rows in bulk, gathered from the normalized table
+        and averaged per document with np.add.reduceat over the flat index array.
+        OOV words take part in the mean (as zeros for w2v, as ngram vectors for fasttext).
+
+        Args:
+            batch: list of tokenized documents.
+            chunk_size: number of documents gathered at once, bounds the memory of the flat table.
+            show_progress: whether to display tqdm progress bar.
+
+        Returns:
+            np.ndarray of shape (len(batch), vector_size), empty documents are zero vectors.
+        """
+        normed = self._get_normed_vectors()
+        key_to_index = self.embeddings.key_to_index
+        oov_cache = {}
+
+        result = np.zeros((len(batch), self.embeddings.vector_size))
+        chunks = range(0, len(batch), chunk_size)
+        for start in tqdm(chunks, desc="Embedding process...", disable=not show_progress):
+            chunk = batch[start : start + chunk_size]
+            lengths = np.fromiter((len(doc) for doc in chunk), dtype=np.int64, count=len(chunk))
+            words = [word for doc in chunk for word in doc]
+            if not words:
+                continue
+
+            idx = np.fromiter((key_to_index.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+            oov_pos = np.flatnonzero(idx < 0)
+            gathered = normed[np.where(idx < 0, 0, idx)]
+
+            if len(oov_pos):
+                oov_to_local = {}
+                local_idx = np.fromiter(
+                    (oov_to_local.setdefault(words[i], len(oov_to_local)) for i in oov_pos),
+                    dtype=np.int64,
+                    count=len(oov_pos),
+                )
+                for word in oov_to_local:
+                    if word not in oov_cache:
+                        oov_cache[word] = self._get_normed_oov_embedding(word)
+                gathered[oov_pos] = np.array([oov_cache[word] for word in oov_to_local])[local_idx]
+
+            # empty docs share the offset of the next doc, so they are excluded from reduceat
+            non_empty = np.flatnonzero(lengths)
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))[non_empty]
+            emb = np.add.reduceat(gathered, offsets, axis=0, dtype=np.float64) / lengths[non_empty, None]
+
+            norm = np.linalg.norm(emb, axis=1, keepdims=True)
+            emb = np.divide(emb, norm, out=emb, where=norm != 0)
+            # TODO: handle zero division differently? is epsilon ok?
+            emb[np.isnan(emb).any(axis=1)] = 0
+            result[start + non_empty] = emb
+
+        return result
 
     def save(self):
         self.output_path.mkdir(parents=True, exist_ok=True)
         np.save(self.output_path / "emb_table.npy", self.emb_table)
+        self._save_index_extras(self.output_path)
         if not self.is_pretrained:
             # str is necessary, gensim checks for extension by endswith method
             self.embeddings.save(str(self.output_path / "model.kv"))
@@ -196,3 +540,8 @@ class BaseWordEmbeddingSearch(BaseEmbeddingSearch, ABC):
             epochs=self.embeddings.epochs,
         )
         self.embeddings = self.embeddings.wv
+        self._normed_vectors = None
+
+    def _load_generation_model(self, generation: Path) -> None:
+        self.embeddings = self.KeyedVectorsClass.load(str(generation / "model.kv"))
+        self._normed_vectors = None
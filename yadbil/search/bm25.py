@@ -3,9 +3,16 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import bm25s
+import numpy as np
 
+from yadbil.data.processing.text.utils.vocab import TokenIds, Vocab, token_ids_path, vocab_path
 from yadbil.search.base import BaseSearch
-from yadbil.utils.data_handling import get_dict_field
+from yadbil.search.generations import IndexGenerations, resolve_generation
+from yadbil.utils.data_handling import get_dict_field, read_records
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class BM25(BaseSearch):
@@ -18,7 +25,17 @@ class BM25(BaseSearch):
             "stemmed_words",
         ),
         bm25_params: Dict[str, Any] = None,
+        incremental_params: Dict[str, Any] = None,
+        token_ids: bool = False,
     ):
+        """
+        Args:
+            incremental_params: If provided, run writes index generations into output_path and tokenizes only
+                records with new uids: uid_field (default 'uid') and IndexGenerations params.
+            token_ids: Build the index from token id arrays saved next to input_path by TextProcessor
+                (token_ids_fields), the JSONL itself is not parsed. The field is the last key of
+                record_processed_data_key_list.
+        """
         if bm25_params is None:
             bm25_params = {}
 
@@ -27,11 +44,13 @@ class BM25(BaseSearch):
         self.retriever = bm25s.BM25(**bm25_params)
         self.input_path = input_path if isinstance(input_path, Path) or (input_path is None) else Path(input_path)
         self.output_path = output_path if isinstance(output_path, Path) or (output_path is None) else Path(output_path)
+        self.incremental_params = incremental_params
+        self.token_ids = token_ids
 
     @classmethod
     def load(cls, path: Union[str, Path]) -> "BM25":
         inst = cls()
-        inst.retriever = bm25s.BM25.load(path, load_corpus=True)
+        inst.retriever = bm25s.BM25.load(resolve_generation(path), load_corpus=True)
         return inst
 
     def save(self):
@@ -44,23 +63,112 @@ class BM25(BaseSearch):
             if self.input_path is None:
                 raise ValueError("No input data provided.")
 
+            if self.token_ids and self.incremental_params is None:
+                self._run_token_ids()
+                return
+
             # TODO: decide how to handle corpus loading and processing and saving
             # now "we" do the handling and you need to keep corpus somewhere near the index
             # but it can be done with the bm25s lib as I understand
             # the question is how to make this lib get the data for index from a particular nested keys/dicts
             # for now it's ok I guess
-            with open(self.input_path, "r") as f:
-                data = [json.loads(line) for line in f]
+            columns = [self.record_processed_data_key_list]
+            if self.incremental_params is not None:
+                columns.append(self.incremental_params.get("uid_field", "uid"))
+            data = read_records(self.input_path, columns=columns)
+
+        if self.incremental_params is not None:
+            self._run_incremental(data)
+            return
 
         data = [get_dict_field(x, self.record_processed_data_key_list) for x in data]
 
         self.retriever.index(data)
         self.save()
 
+    def _run_token_ids(self) -> None:
+        field = self.record_processed_data_key_list[-1]
+        vocab = Vocab.load(vocab_path(self.input_path))
+        token_ids = TokenIds.load(token_ids_path(self.input_path, field))
+        # the vocabulary is shared with other fields, keep only tokens of this one
+        used, ids = np.unique(token_ids.ids, return_inverse=True)
+        corpus_ids = TokenIds(token_ids.indptr, ids.astype(np.int32)).to_lists()
+        index_vocab = {token: i for i, token in enumerate(vocab.decode(used.tolist()))}
+        logger.info(
+            f"Indexing {len(corpus_ids)} documents from {field} token ids, vocabulary size: {len(index_vocab)}"
+        )
+        self.retriever.index((corpus_ids, index_vocab), show_progress=False)
+        self.save()
+
+    def _run_incremental(self, records: List[Dict[str, Any]]) -> None:
+        """Build the next index generation, token ids of known uids are taken from the current one.
+
+        Global statistics (idf, average length) change with every new document, so bm25s recomputes
+        the score matrix, but only new documents are mapped to vocabulary ids.
+        Compaction rebuilds the vocabulary, dropping tokens of removed documents.
+        """
+        params = dict(self.incremental_params)
+        uid_field = params.pop("uid_field", "uid")
+        generations = IndexGenerations(self.output_path, **params)
+        uids = [get_dict_field(record, [uid_field]) for record in records]
+        docs = [get_dict_field(record, self.record_processed_data_key_list) for record in records]
+
+        if generations.should_compact():
+            logger.info(f"Rebuilding index from scratch for {len(records)} records...")
+            vocab = {}
+            old_rows = np.full(len(records), -1)
+            indptr, ids = np.zeros(1, dtype=np.int64), np.array([], dtype=np.int32)
+        else:
+            current = generations.current()
+            vocab, indptr, ids = self._load_doc_tokens(current)
+            old_rows = generations.match_uids(current, uids)
+            logger.info(f"Updating index: {np.sum(old_rows < 0)} new of {len(records)} records")
+
+        corpus_ids = [
+            ids[indptr[row] : indptr[row + 1]].tolist()
+            if row >= 0
+            else [vocab.setdefault(token, len(vocab)) for token in doc]
+            for row, doc in zip(old_rows.tolist(), docs)
+        ]
+        self.retriever.index((corpus_ids, vocab), show_progress=False)
+
+        output_path = self.output_path
+        with generations.stage(uids) as staged:
+            self.output_path = staged
+            try:
+                self.save()
+                self._save_doc_tokens(staged, corpus_ids, vocab)
+            finally:
+                self.output_path = output_path
+
+    @staticmethod
+    def _save_doc_tokens(path: Path, corpus_ids: List[List[int]], vocab: Dict[str, int]) -> None:
+        # per-document token ids as offsets into one flat array
+        indptr = np.cumsum([0] + [len(doc) for doc in corpus_ids], dtype=np.int64)
+        ids = np.fromiter((i for doc in corpus_ids for i in doc), dtype=np.int32, count=indptr[-1])
+        np.savez(path / "doc_tokens.npz", indptr=indptr, ids=ids)
+        with open(path / "doc_tokens_vocab.json", "w") as f:
+            json.dump(list(vocab), f, ensure_ascii=False)
+
+    @staticmethod
+    def _load_doc_tokens(path: Path) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        with open(path / "doc_tokens_vocab.json") as f:
+            vocab = {token: i for i, token in enumerate(json.load(f))}
+        with np.load(path / "doc_tokens.npz") as arrays:
+            return vocab, arrays["indptr"], arrays["ids"]
+
     def query(self, query: str, n: int = 10):
         results, scores = self.retriever.retrieve([query], k=n)
         return results[0], scores[0]
 
+    def query_batch(self, queries: List[List[str]], n: int = 10, n_threads: int = 0):
+        """Retrieve top n documents for many tokenized queries in one bm25s call.
+
+        Returns:
+            A tuple of result IDs and scores, both of shape (len(queries), n).
+        """
+        return self.retriever.retrieve(queries, k=n, n_threads=n_threads, show_progress=False)
+
 
 if __name__ == "__main__":
     from yadbil.pipeline.config import PipelineConfig
@@ -0,0 +1,121 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+
+class EmbeddingCache:
+    # sqlite versions before 3.32 allow at most 999 bound parameters per statement
+    MAX_PARAMS = 900
+
+    def __init__(self, path: Union[str, Path], model: str, dim: int, lru_size: int = 10_000):
+        """Persistent content-addressed cache of embeddings in a SQLite file.
+
+        Rows are keyed by sha256 of (model, dim, text), so a changed model or dimension never hits
+        stale vectors and the same file can hold several models. Vectors are stored as float32 blobs.
+
+        Args:
+            path: SQLite file, created if missing.
+            model: Embeddings model name, part of the key.
+            dim: Embedding dimension, part of the key.
+            lru_size: Max number of vectors kept in memory for single lookups (queries). 0 disables it.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self.dim = dim
+
+        # streamlit serves sessions from several threads, the connection, LRU and counters are shared under a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+        self.lru_size = lru_size
+        self.lru: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{self.dim}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors in the order of texts, None for misses."""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.MAX_PARAMS):
+                chunk = keys[start : start + self.MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update(rows)
+            # per text, duplicated texts are counted every time
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+            # zero vectors are fallbacks for failed requests, they must be embedded again next time
+            if np.any(vector)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Single lookup through the in-memory LRU, falls back to the SQLite file."""
+        key = self._key(text)
+        with self._lock:
+            vector = self.lru.get(key)
+            if vector is not None:
+                self.hits += 1
+                self.lru.move_to_end(key)
+                return vector
+
+        vector = self.get_many([text])[0]
+        if vector is not None:
+            self._remember(key, vector)
+        return vector
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        self.put_many([text], [vector])
+        # a failed query must not be served from memory either
+        if np.any(vector):
+            self._remember(self._key(text), np.asarray(vector, dtype=np.float32))
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        if not self.lru_size:
+            return
+        with self._lock:
+            self.lru[key] = vector
+            if len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def cache_info(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            hits, misses, lru_size = self.hits, self.misses, len(self.lru)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "lru_size": lru_size,
+            "max_lru_size": self.lru_size,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
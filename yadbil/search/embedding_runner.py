@@ -0,0 +1,218 @@
+import asyncio
+import random
+import time
+from typing import Callable, Optional
+
+import numpy as np
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+from tqdm.auto import tqdm
+
+from yadbil.utils.logger import get_logger
+
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+logger = get_logger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough upper bound of the token count, used when tiktoken is not installed."""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    if tiktoken is None:
+        return estimate_tokens
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_batches(token_counts: list[int], max_batch_tokens: int, max_batch_size: int) -> list[tuple[int, int]]:
+    """Split consecutive texts into (start, end) ranges bounded by the total token count and the number of inputs.
+
+    A text longer than max_batch_tokens gets a batch of its own.
+    """
+    batches = []
+    start, batch_tokens = 0, 0
+    for i, n_tokens in enumerate(token_counts):
+        if i > start and (batch_tokens + n_tokens > max_batch_tokens or i - start == max_batch_size):
+            batches.append((start, i))
+            start, batch_tokens = i, 0
+        batch_tokens += n_tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """Bucket refilled continuously at per_minute / 60 units per second, holds at most per_minute units."""
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available, 0 if they are available now."""
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (min(amount, self.capacity) - self.available) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """Requests-per-minute and tokens-per-minute limits, each one is skipped if None.
+
+        Must be created inside a running event loop.
+        """
+        # (bucket, counts tokens) pairs, request buckets take one unit per request
+        self.buckets = []
+        if rpm:
+            self.buckets.append((TokenBucket(rpm), False))
+        if tpm:
+            self.buckets.append((TokenBucket(tpm), True))
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n_tokens: int) -> None:
+        # requests are served in order of arrival, a large batch is not starved by small ones
+        async with self._lock:
+            while True:
+                wait = max((b.wait_time(n_tokens if is_tokens else 1) for b, is_tokens in self.buckets), default=0.0)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            for bucket, is_tokens in self.buckets:
+                bucket.consume(n_tokens if is_tokens else 1)
+
+
+class AsyncEmbeddingRunner:
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-3-small",
+        base_url: Optional[str] = None,
+        max_in_flight: int = 8,
+        rpm: Optional[int] = 3000,
+        tpm: Optional[int] = 1_000_000,
+        max_batch_tokens: int = 100_000,
+        max_batch_size: int = 2048,
+        retries: int = 5,
+        initial_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 60.0,
+    ):
+        """Embeds texts with many concurrent requests under OpenAI rate limits.
+
+        Texts are packed into batches by token count, batches are sent concurrently
+        and each failed batch is retried on its own with exponential backoff and full jitter,
+        so one rate limited request does not block the rest of the job.
+
+        Args:
+            api_key: OpenAI API key.
+            model: Embeddings model.
+            base_url: API url, e.g. of a local server compatible with the embeddings endpoint.
+            max_in_flight: Max number of concurrent requests.
+            rpm: Requests per minute limit of the account, None to disable.
+            tpm: Tokens per minute limit of the account, None to disable.
+            max_batch_tokens: Max total tokens of one request.
+            max_batch_size: Max number of inputs of one request, 2048 for OpenAI.
+            retries: Max retries per batch for rate limits, server and connection errors.
+            initial_delay: Backoff ceiling of the first retry in seconds.
+            max_delay: Max backoff ceiling in seconds.
+            timeout: Timeout of one request in seconds.
+        """
+        # retries are handled here per batch, client ones would not respect the shared limiter
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=timeout)
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.retries = retries
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.count_tokens = get_token_counter(model)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return isinstance(error, APIConnectionError)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        retry_after = None
+        if isinstance(error, APIStatusError):
+            retry_after = error.response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.initial_delay * 2**attempt))
+
+    async def _embed_batch(
+        self,
+        texts: list[str],
+        n_tokens: int,
+        semaphore: asyncio.Semaphore,
+        limiter: RateLimiter,
+    ) -> np.ndarray:
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                await limiter.acquire(n_tokens)
+                try:
+                    response = await self.client.embeddings.create(input=texts, model=self.model)
+                    # items are documented to follow the input order, index makes it explicit
+                    data = sorted(response.data, key=lambda x: x.index)
+                    return np.array([x.embedding for x in data], dtype=np.float32)
+                except Exception as e:
+                    if attempt == self.retries or not self._is_retryable(e):
+                        logger.error(f"Embedding batch of {len(texts)} texts failed after {attempt} retries: {e}")
+                        raise
+                    error = e
+            # sleep outside of the semaphore, other batches keep going meanwhile
+            delay = self._retry_delay(error, attempt)
+            logger.warning(
+                f"Embedding batch failed on attempt {attempt + 1}, retrying in {delay:.2f}s. Error: {error}"
+            )
+            await asyncio.sleep(delay)
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        token_counts = [self.count_tokens(text) for text in texts]
+        batches = pack_batches(token_counts, self.max_batch_tokens, self.max_batch_size)
+        logger.info(f"Embedding {len(texts)} texts, {sum(token_counts)} tokens in {len(batches)} batches")
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        limiter = RateLimiter(self.rpm, self.tpm)
+        progress = tqdm(total=len(texts), desc="Embedding process...")
+
+        async def embed_batch(start: int, end: int) -> np.ndarray:
+            result = await self._embed_batch(texts[start:end], sum(token_counts[start:end]), semaphore, limiter)
+            progress.update(end - start)
+            return result
+
+        tasks = [asyncio.create_task(embed_batch(start, end)) for start, end in batches]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            progress.close()
+        return np.concatenate(results) if results else np.empty((0, 0), dtype=np.float32)
+
+    def run(self, texts: list[str]) -> np.ndarray:
+        """Synchronous entry point, returns embeddings in the order of texts."""
+        return asyncio.run(self.embed(texts))
@@ -1,10 +1,10 @@
 from pathlib import Path
 from typing import Union
 
-import numpy as np
 from gensim.models.fasttext import FastText, FastTextKeyedVectors
 
 from yadbil.search.base import BaseWordEmbeddingSearch
+from yadbil.search.generations import resolve_generation
 from yadbil.utils.logger import get_logger
 
 
@@ -26,10 +26,15 @@ class FastTextWrapper(BaseWordEmbeddingSearch):
         return ["processed_text", "words"]
 
     @classmethod
-    def load(cls, pretrained_emb_model_path: Union[str, Path], data_path: Union[str, Path]) -> "FastTextWrapper":
-        inst = cls()
-        inst.embeddings = FastTextKeyedVectors.load(pretrained_emb_model_path)
-        inst.emb_table = np.load(data_path)
+    def load(
+        cls,
+        pretrained_emb_model_path: Union[str, Path],
+        data_path: Union[str, Path],
+        storage_params: dict = None,
+    ) -> "FastTextWrapper":
+        inst = cls(storage_params=storage_params)
+        inst.embeddings = FastTextKeyedVectors.load(str(resolve_generation(pretrained_emb_model_path)))
+        inst._load_index_extras(data_path)
         return inst
 
 
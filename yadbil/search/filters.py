@@ -0,0 +1,129 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from yadbil.utils.data_handling import get_dict_field
+
+
+DateLike = Union[str, datetime, float, int]
+
+
+def to_timestamp(date: DateLike) -> float:
+    """Converts an isoformat string or datetime to a unix timestamp, numbers are returned as is."""
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    if isinstance(date, datetime):
+        return date.timestamp()
+    return float(date)
+
+
+class PostingFilter:
+    DIR_NAME = "filters"
+
+    def __init__(self, fields: Sequence[str] = ("channel",), date_field: Optional[str] = "date"):
+        """Posting arrays of table rows built at index time for fast pre-filtering.
+
+        Args:
+            fields: Categorical record fields (e.g. channel), each value gets a sorted array of row ids.
+            date_field: Record field with isoformat dates, rows are kept sorted by date for range lookups.
+        """
+        self.fields = list(fields)
+        self.date_field = date_field
+        self.n_rows = 0
+        # field -> value -> sorted row ids
+        self.postings: Dict[str, Dict[Any, np.ndarray]] = {}
+        self.date_order = None
+        self.sorted_dates = None
+
+    def fit(self, records: List[Dict[str, Any]]) -> "PostingFilter":
+        self.n_rows = len(records)
+        for field in self.fields:
+            rows_by_value = {}
+            for i, record in enumerate(records):
+                rows_by_value.setdefault(get_dict_field(record, [field]), []).append(i)
+            self.postings[field] = {value: np.array(rows, dtype=np.int64) for value, rows in rows_by_value.items()}
+
+        if self.date_field is not None:
+            dates = np.array([to_timestamp(record[self.date_field]) for record in records], dtype=np.float64)
+            self.date_order = np.argsort(dates, kind="stable")
+            self.sorted_dates = dates[self.date_order]
+        return self
+
+    def select(
+        self,
+        date_from: Optional[DateLike] = None,
+        date_to: Optional[DateLike] = None,
+        **field_values: Union[Any, Sequence[Any]],
+    ) -> np.ndarray:
+        """Row ids passing all conditions, sorted in ascending order.
+
+        Args:
+            date_from: Inclusive lower bound of the date range.
+            date_to: Inclusive upper bound of the date range.
+            field_values: Allowed value or list of values per categorical field, e.g. channel=["a", "b"].
+
+        Returns:
+            np.ndarray: Sorted row ids.
+        """
+        selected = None
+        for field, values in field_values.items():
+            if field not in self.postings:
+                raise ValueError(f"Unknown filter field: {field}. Available: {self.fields}")
+            if isinstance(values, (str, int)):
+                values = [values]
+            postings = [self.postings[field][v] for v in values if v in self.postings[field]]
+            rows = np.unique(np.concatenate(postings)) if postings else np.array([], dtype=np.int64)
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+
+        if date_from is not None or date_to is not None:
+            if self.sorted_dates is None:
+                raise ValueError("Date filter is not available, date_field was not set.")
+            start = np.searchsorted(self.sorted_dates, to_timestamp(date_from), "left") if date_from is not None else 0
+            end = (
+                np.searchsorted(self.sorted_dates, to_timestamp(date_to), "right")
+                if date_to is not None
+                else len(self.sorted_dates)
+            )
+            rows = np.sort(self.date_order[start:end])
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+
+        return np.arange(self.n_rows) if selected is None else selected
+
+    def save(self, path: Union[str, Path]) -> None:
+        path = Path(path) / self.DIR_NAME
+        path.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        meta = {"fields": self.fields, "date_field": self.date_field, "n_rows": self.n_rows, "values": {}}
+        for field, postings in self.postings.items():
+            # columnar layout: values in json, row ids of all values in one flat array with offsets
+            meta["values"][field] = list(postings)
+            arrays[f"{field}_indptr"] = np.cumsum([0] + [len(rows) for rows in postings.values()])
+            arrays[f"{field}_ids"] = np.concatenate(list(postings.values())) if postings else np.array([], np.int64)
+        if self.date_order is not None:
+            arrays["date_order"] = self.date_order
+            arrays["sorted_dates"] = self.sorted_dates
+        np.savez(path / "postings.npz", **arrays)
+        with open(path / "meta.json", "w") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["PostingFilter"]:
+        """Load filters saved in the path directory, None if there are no filters."""
+        path = Path(path) / cls.DIR_NAME
+        if not (path / "meta.json").exists():
+            return None
+        with open(path / "meta.json") as f:
+            meta = json.load(f)
+        inst = cls(fields=meta["fields"], date_field=meta["date_field"])
+        inst.n_rows = meta["n_rows"]
+        with np.load(path / "postings.npz") as arrays:
+            for field, values in meta["values"].items():
+                indptr, ids = arrays[f"{field}_indptr"], arrays[f"{field}_ids"]
+                inst.postings[field] = {v: ids[indptr[i] : indptr[i + 1]] for i, v in enumerate(values)}
+            if "date_order" in arrays:
+                inst.date_order = arrays["date_order"]
+                inst.sorted_dates = arrays["sorted_dates"]
+        return inst
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Hashable, Iterator, List, Optional, Union
+
+import numpy as np
+
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+CURRENT_FILE = "CURRENT"
+UIDS_FILE = "uids.json"
+
+
+def resolve_generation(path: Union[str, Path]) -> Path:
+    """Map a path inside an index directory to the current generation, other paths are returned as is.
+
+    Works both for the directory itself (output_path -> output_path/gen-000003)
+    and for files in it (output_path/emb_table.npy -> output_path/gen-000003/emb_table.npy).
+    """
+    path = Path(path)
+    if (path / CURRENT_FILE).is_file():
+        return path / (path / CURRENT_FILE).read_text().strip()
+    if (path.parent / CURRENT_FILE).is_file():
+        return path.parent / (path.parent / CURRENT_FILE).read_text().strip() / path.name
+    return path
+
+
+class IndexGenerations:
+    NAME_PATTERN = re.compile(r"^gen-(\d{6})$")
+
+    def __init__(self, root: Union[str, Path], keep_generations: int = 2, compact_every: int = 10):
+        """Immutable index generations in one directory, root/CURRENT names the one readers should use.
+
+        A new generation is written to a hidden temporary directory, renamed into place
+        and then published by atomically replacing CURRENT, so readers never see a partial index.
+
+        Args:
+            root: Index directory (output_path of the step).
+            keep_generations: Number of generations kept on disk, older ones are removed after publishing.
+            compact_every: Every compact_every-th generation is rebuilt from scratch instead of updated.
+        """
+        self.root = Path(root)
+        self.keep_generations = max(1, keep_generations)
+        self.compact_every = compact_every
+
+    def _number(self, path: Path) -> int:
+        return int(self.NAME_PATTERN.match(path.name).group(1))
+
+    def all(self) -> List[Path]:
+        if not self.root.exists():
+            return []
+        return sorted(p for p in self.root.iterdir() if p.is_dir() and self.NAME_PATTERN.match(p.name))
+
+    def current(self) -> Optional[Path]:
+        current = resolve_generation(self.root)
+        return current if current != self.root else None
+
+    def next_number(self) -> int:
+        generations = self.all()
+        return self._number(generations[-1]) + 1 if generations else 1
+
+    def should_compact(self) -> bool:
+        return self.current() is None or (self.compact_every > 0 and self.next_number() % self.compact_every == 0)
+
+    @staticmethod
+    def load_uids(generation: Path) -> List[Hashable]:
+        with open(generation / UIDS_FILE) as f:
+            return json.load(f)
+
+    def match_uids(self, generation: Path, uids: List[Hashable]) -> np.ndarray:
+        """Row of every uid in the given generation, -1 for new uids."""
+        old_rows = {uid: i for i, uid in enumerate(self.load_uids(generation))}
+        return np.fromiter((old_rows.get(uid, -1) for uid in uids), dtype=np.int64, count=len(uids))
+
+    @contextmanager
+    def stage(self, uids: List[Hashable]) -> Iterator[Path]:
+        """Yield an empty directory to save the new generation into, publish it when the block succeeds."""
+        name = f"gen-{self.next_number():06d}"
+        staged = self.root / f".{name}.tmp"
+        if staged.exists():
+            shutil.rmtree(staged)
+        staged.mkdir(parents=True)
+        try:
+            with open(staged / UIDS_FILE, "w") as f:
+                json.dump(uids, f, ensure_ascii=False)
+            yield staged
+        except BaseException:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+
+        os.rename(staged, self.root / name)
+        tmp_current = self.root / f".{CURRENT_FILE}.tmp"
+        tmp_current.write_text(name)
+        os.replace(tmp_current, self.root / CURRENT_FILE)
+        logger.info(f"Published index generation {self.root / name}")
+        self._remove_old()
+
+    def _remove_old(self) -> None:
+        for generation in self.all()[: -self.keep_generations]:
+            shutil.rmtree(generation, ignore_errors=True)
@@ -1,4 +1,3 @@
-import json
 from pathlib import Path
 from typing import Union
 
@@ -8,21 +7,32 @@ from tqdm.auto import tqdm
 
 from yadbil.pipeline.creds import OpenAICreds
 from yadbil.search.base import BaseEmbeddingSearch
-from yadbil.utils.data_handling import get_dict_field
+from yadbil.search.embedding_cache import EmbeddingCache
+from yadbil.search.embedding_runner import AsyncEmbeddingRunner
 from yadbil.utils.logger import get_logger
 from yadbil.utils.retry import retry_with_backoff
 
 
 logger = get_logger(__name__)
 
+# looks like max batch size is 2048
+# https://community.openai.com/t/embeddings-api-max-batch-size/655329/3
+MAX_BATCH_SIZE = 2048
+
 
 class Embedder:
-    def __init__(self, api_key: str, model: str = "text-embedding-3-small", emb_dim: int = 1536):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-3-small",
+        emb_dim: int = 1536,
+    ):
         """
         Initialize the Embedder with the provided API key and model.
 
         :param api_key: Your OpenAI API key.
         :param model: The OpenAI embeddings model to use.
+        :param emb_dim: Dimension of the model embeddings.
         """
         self.client = OpenAI(api_key=api_key)
         self.model = model
@@ -64,11 +74,11 @@ class Embedder:
             return [np.zeros(self.emb_dim) for _ in range(len(texts))]
 
 
-# TODO: add matryoshka reduction
-# TODO: add batch processing
-# TODO: add optimized requests (1M tokens per minute is max)
-# check this https://cookbook.openai.com/examples/how_to_handle_rate_limits for smth useful
 class OpenAISearch(BaseEmbeddingSearch):
+    # nothing to train, base run only embeds
+    is_pretrained = True
+    max_query_batch = MAX_BATCH_SIZE
+
     def __init__(
         self,
         input_path: Union[str, Path] = None,
@@ -77,28 +87,57 @@ class OpenAISearch(BaseEmbeddingSearch):
         record_processed_data_key_list: list[str] = None,
         model: str = "text-embedding-3-small",
         batch_size: int = 1,
+        ann_params: dict = None,
+        filter_params: dict = None,
+        storage_params: dict = None,
+        async_params: dict = None,
+        cache_params: dict = None,
+        incremental_params: dict = None,
     ):
+        """
+        Args:
+            async_params: AsyncEmbeddingRunner params, if provided the table is embedded with concurrent
+                rate limited requests packed by token count instead of the sequential batch_size loop.
+            cache_params: EmbeddingCache params except model and dim (path, lru_size), if provided only texts
+                missing from the cache are sent to the API and queries are looked up in the cache first.
+        """
         self.input_path = Path(input_path) if input_path else None
         self.output_path = Path(output_path) if output_path else None
         self.record_processed_data_key_list = record_processed_data_key_list or ["orig_text"]
         self.embedder = Embedder(api_key=creds.api_key, model=model)
         self.emb_table = None
-        # looks like max batch size is 2048
-        # https://community.openai.com/t/embeddings-api-max-batch-size/655329/3
-        self.batch_size = min(batch_size, 2048)
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.async_runner = (
+            AsyncEmbeddingRunner(api_key=creds.api_key, model=model, **async_params)
+            if async_params is not None
+            else None
+        )
+        self.cache = (
+            EmbeddingCache(model=model, dim=self.embedder.emb_dim, **cache_params)
+            if cache_params is not None
+            else None
+        )
+        self._init_index_extras(ann_params, filter_params, storage_params, incremental_params)
 
     def load(self, path: str) -> None:
-        self.emb_table = np.load(Path(path) / "emb_table.npy")
+        self._load_index_extras(Path(path) / "emb_table.npy")
 
     def save(self) -> None:
         if self.output_path and self.emb_table is not None:
             self.output_path.mkdir(parents=True, exist_ok=True)
             np.save(self.output_path / "emb_table.npy", self.emb_table)
+            self._save_index_extras(self.output_path)
         elif not self.output_path:
             raise ValueError("Output path not provided.")
 
     # TODO: use only batch?
     def _embed_and_normalize_query(self, query: str) -> np.ndarray:
+        if self.cache is not None:
+            embedding = self.cache.get(query)
+            if embedding is None:
+                embedding = self.embedder.get_embedding(query)
+                self.cache.put(query, embedding)
+            return embedding
         embedding = self.embedder.get_embedding(query)
         return embedding  # normalized by default
 
@@ -106,28 +145,51 @@ class OpenAISearch(BaseEmbeddingSearch):
         embeddings = self.embedder.get_embeddings_batch(batch)
         return embeddings
 
-    def run(self, data=None):
-        if data is None:
-            if self.input_path is None:
-                raise ValueError("No input data provided.")
-            with open(self.input_path, "r") as f:
-                data = [json.loads(line) for line in f]
-
-        data = [get_dict_field(x, self.record_processed_data_key_list) for x in data]
+    def _embed_texts(self, texts: list[str]) -> np.ndarray:
+        if self.async_runner is not None:
+            return self.async_runner.run(texts)
 
         # Added batch processing logic if batch_size > 1
         if self.batch_size > 1:
             embeddings = []
-            for i in tqdm(range(0, len(data), self.batch_size), desc="Embedding process..."):
-                batch = data[i : i + self.batch_size]
+            for i in tqdm(range(0, len(texts), self.batch_size), desc="Embedding process..."):
+                batch = texts[i : i + self.batch_size]
                 batch_embeddings = self._embed_and_normalize_batch(batch)
                 embeddings.extend(batch_embeddings)
-            self.emb_table = np.array(embeddings)
-        else:
-            self.emb_table = np.array(
-                [self._embed_and_normalize_query(x) for x in tqdm(data, desc="Embedding process...")]
-            )
-        self.save()
+            return np.array(embeddings)
+        return np.array([self.embedder.get_embedding(x) for x in tqdm(texts, desc="Embedding process...")])
+
+    def _embed_texts_cached(self, texts: list[str]) -> np.ndarray:
+        """Embed only texts missing from the cache, the table is assembled from cached and new rows."""
+        cached = self.cache.get_many(texts)
+        # duplicated posts are embedded once
+        missing = list(dict.fromkeys(text for text, emb in zip(texts, cached) if emb is None))
+        n_hits = sum(emb is not None for emb in cached)
+        logger.info(
+            f"Embedding cache: {n_hits}/{len(texts)} hits ({n_hits / max(len(texts), 1):.1%}), "
+            f"embedding {len(missing)} new texts"
+        )
+
+        new = {}
+        if missing:
+            embeddings = self._embed_texts(missing)
+            self.cache.put_many(missing, embeddings)
+            new = dict(zip(missing, embeddings))
+        return np.array([emb if emb is not None else new[text] for text, emb in zip(texts, cached)], dtype=np.float32)
+
+    def _embed_table(self, texts: list[str]) -> np.ndarray:
+        if self.cache is not None:
+            return self._embed_texts_cached(texts)
+        return self._embed_texts(texts)
+
+    def _embed_query_batch(self, queries: list[str]) -> np.ndarray:
+        # same path as the table: cache, async runner or batches of batch_size
+        embeddings = np.asarray(self._embed_table(queries))
+        # zero rows are fallbacks of failed requests, scoring them would return meaningless ties
+        failed = ~np.any(embeddings, axis=1)
+        if failed.any():
+            raise RuntimeError(f"Failed to embed {failed.sum()} of {len(queries)} queries")
+        return embeddings
 
 
 # Example usage:
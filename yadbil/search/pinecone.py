@@ -1,4 +1,5 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Union
 
@@ -9,6 +10,7 @@ from pinecone.core.openapi.data.model.scored_vector import ScoredVector
 from yadbil.pipeline.config import PipelineConfig
 from yadbil.pipeline.creds import PineconeCreds
 from yadbil.search.base import BaseSearch
+from yadbil.search.storage import truncate_and_normalize
 from yadbil.utils.logger import get_logger
 
 
@@ -38,11 +40,14 @@ class PineconeSearch(BaseSearch):
         host: Optional[str] = None,
         data_fields: Optional[dict] = None,
         batch_size: int = 100,
+        reduced_dim: Optional[int] = None,
     ):
         self.input_path = Path(input_path) if input_path else None
         self.input_path_data = Path(input_path_data) if input_path_data else None
         self.index_name = index_name
-        self.dimension = dimension
+        # matryoshka embeddings: upload and query only the renormalized prefix of reduced_dim components
+        self.reduced_dim = reduced_dim
+        self.dimension = reduced_dim or dimension
         self.metric = metric
         self.namespace = namespace
         self.cloud = cloud
@@ -136,6 +141,8 @@ class PineconeSearch(BaseSearch):
         Returns:
             list[ScoredVector]: List of matched vectors with their scores
         """
+        if self.reduced_dim is not None:
+            query_vector = truncate_and_normalize(query_vector, self.reduced_dim).tolist()
         response = self.index.query(
             namespace=self.namespace,
             vector=list(query_vector),  # Convert numpy array to list
@@ -146,6 +153,39 @@ class PineconeSearch(BaseSearch):
         )
         return [x.to_dict() for x in response.matches]
 
+    def query_batch(
+        self,
+        query_vectors: np.ndarray,
+        n: int = 10,
+        filter: Optional[dict] = None,
+        n_threads: int = 8,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Query Pinecone index with many vectors concurrently.
+
+        Args:
+            query_vectors: Query vectors of shape (q, dimension)
+            n: Number of results to return per query
+            filter: Optional metadata filter dictionary
+            n_threads: Number of requests in flight
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: ids (object dtype, None-padded) and scores (nan-padded) of shape (q, n)
+        """
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            results = list(
+                executor.map(
+                    lambda vector: self.query(vector, n=n, filter=filter, include_metadata=False),
+                    query_vectors,
+                )
+            )
+
+        ids = np.full((len(results), n), None, dtype=object)
+        scores = np.full((len(results), n), np.nan)
+        for i, matches in enumerate(results):
+            ids[i, : len(matches)] = [x["id"] for x in matches]
+            scores[i, : len(matches)] = [x["score"] for x in matches]
+        return ids, scores
+
     def run(self, data: Optional[np.ndarray] = None) -> None:
         """Store vectors in Pinecone index.
 
@@ -160,6 +200,8 @@ class PineconeSearch(BaseSearch):
             if self.input_path is None:
                 raise ValueError("No input data provided.")
             data = np.load(self.input_path)
+        if self.reduced_dim is not None:
+            data = truncate_and_normalize(data, self.reduced_dim)
 
         records = self._load_text_data()
         records = [self._filter_record_fields(x) for x in records]
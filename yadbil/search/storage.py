@@ -0,0 +1,121 @@
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+
+COMPACT_DTYPES = ("float16", "int8")
+
+
+class CompactEmbTable:
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray] = None, chunk_size: int = 65536):
+        """Embedding table stored as float16 or as int8 codes with per-row scales.
+
+        Mimics the parts of np.ndarray used by search: len, shape, row indexing and dot.
+        Scoring runs chunk by chunk on the compact codes, so the table is never
+        materialized in float and memory-mapped codes stay shared between processes.
+
+        Args:
+            codes: float16 table or int8 codes of shape (n_rows, dim).
+            scales: float32 per-row scales for int8 codes, row = codes * scale.
+            chunk_size: Rows converted to float32 at once during scoring.
+        """
+        self.codes = codes
+        self.scales = scales
+        self.chunk_size = chunk_size
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.codes.shape
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, idx) -> np.ndarray:
+        rows = np.asarray(self.codes[idx], dtype=np.float32)
+        if self.scales is not None:
+            scales = np.asarray(self.scales[idx], dtype=np.float32)
+            rows = rows * (scales[..., None] if rows.ndim > 1 else scales)
+        return rows
+
+    def dot(self, x: np.ndarray) -> np.ndarray:
+        """Same as np.dot(table, x) for x of shape (dim,) or (dim, q)."""
+        x = np.asarray(x, dtype=np.float32)
+        out = np.empty((len(self),) + x.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), self.chunk_size):
+            end = min(start + self.chunk_size, len(self))
+            # scale after the product: one multiply per score instead of one per table value
+            scores = np.asarray(self.codes[start:end], dtype=np.float32) @ x
+            if self.scales is not None:
+                scales = self.scales[start:end]
+                scores *= scales[:, None] if scores.ndim > 1 else scales
+            out[start:end] = scores
+        return out
+
+
+def compact_paths(data_path: Union[str, Path], dtype: str) -> tuple[Path, Path]:
+    """Paths of compact codes and scales next to the float table, e.g. emb_table_int8.npy."""
+    data_path = Path(data_path)
+    return (
+        data_path.with_name(f"{data_path.stem}_{dtype}.npy"),
+        data_path.with_name(f"{data_path.stem}_{dtype}_scales.npy"),
+    )
+
+
+def full_table_path(data_path: Union[str, Path]) -> Path:
+    """Path of full-dimensional vectors kept next to a truncated table, e.g. emb_table_full.npy."""
+    data_path = Path(data_path)
+    return data_path.with_name(f"{data_path.stem}_full.npy")
+
+
+def truncate_and_normalize(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the first dim components of matryoshka embeddings and renormalize them to unit length.
+
+    Args:
+        vectors: A single vector of shape (full_dim,) or a table of shape (n_rows, full_dim).
+        dim: Reduced dimension, e.g. 256 or 512 for text-embedding-3 models.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dim]
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norm, out=np.zeros_like(vectors), where=norm != 0)
+
+
+def quantize_int8(emb_table: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric scalar quantization with one scale per row."""
+    scales = np.abs(emb_table).max(axis=1) / 127
+    codes = np.divide(emb_table, scales[:, None], out=np.zeros_like(emb_table), where=scales[:, None] != 0)
+    return np.round(codes).astype(np.int8), scales.astype(np.float32)
+
+
+def save_compact_emb_table(data_path: Union[str, Path], emb_table: np.ndarray, dtype: str) -> None:
+    if dtype not in COMPACT_DTYPES:
+        raise ValueError(f"Unknown storage dtype: {dtype}. Use one of {COMPACT_DTYPES}.")
+    codes_path, scales_path = compact_paths(data_path, dtype)
+    if dtype == "float16":
+        np.save(codes_path, emb_table.astype(np.float16))
+    else:
+        codes, scales = quantize_int8(emb_table)
+        np.save(codes_path, codes)
+        np.save(scales_path, scales)
+
+
+def load_emb_table(
+    data_path: Union[str, Path],
+    dtype: Optional[str] = None,
+    mmap: bool = False,
+) -> Union[np.ndarray, CompactEmbTable]:
+    """Load the float table or its compact version.
+
+    Args:
+        data_path: Path to the float emb_table.npy, compact files are looked up next to it.
+        dtype: None for the float table, 'float16' or 'int8' for compact ones.
+        mmap: Open arrays with mmap_mode='r', so processes on one host share pages through the OS page cache.
+    """
+    mmap_mode = "r" if mmap else None
+    if dtype is None:
+        return np.load(data_path, mmap_mode=mmap_mode)
+
+    codes_path, scales_path = compact_paths(data_path, dtype)
+    codes = np.load(codes_path, mmap_mode=mmap_mode)
+    scales = np.load(scales_path, mmap_mode=mmap_mode) if dtype == "int8" else None
+    return CompactEmbTable(codes, scales)
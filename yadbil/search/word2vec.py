@@ -1,11 +1,11 @@
 from pathlib import Path
 from typing import Union
 
-import numpy as np
 from gensim.models import KeyedVectors
 from gensim.models.word2vec import Word2Vec
 
 from yadbil.search.base import BaseWordEmbeddingSearch
+from yadbil.search.generations import resolve_generation
 from yadbil.utils.logger import get_logger
 
 
@@ -27,10 +27,15 @@ class Word2VecWrapper(BaseWordEmbeddingSearch):
         return ["processed_text", "stemmed_words"]
 
     @classmethod
-    def load(cls, pretrained_emb_model_path: Union[str, Path], data_path: Union[str, Path]) -> "Word2VecWrapper":
-        inst = cls()
-        inst.embeddings = KeyedVectors.load(pretrained_emb_model_path)
-        inst.emb_table = np.load(data_path)
+    def load(
+        cls,
+        pretrained_emb_model_path: Union[str, Path],
+        data_path: Union[str, Path],
+        storage_params: dict = None,
+    ) -> "Word2VecWrapper":
+        inst = cls(storage_params=storage_params)
+        inst.embeddings = KeyedVectors.load(str(resolve_generation(pretrained_emb_model_path)))
+        inst._load_index_extras(data_path)
         return inst
 
 
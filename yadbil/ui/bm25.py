@@ -1,4 +1,3 @@
-import json
 from pathlib import Path
 
 import streamlit as st
@@ -8,7 +7,8 @@ import yaml
 from yadbil.data.processing.text.processing import TextProcessor
 from yadbil.pipeline.config import PipelineConfig
 from yadbil.search.bm25 import BM25
-from yadbil.ui.utils.st_utils import tg_html
+from yadbil.ui.utils.st_utils import POST_COLUMNS, tg_html
+from yadbil.utils.data_handling import read_records
 
 
 # TODO: rework this mess with session state
@@ -33,8 +33,7 @@ if "bm25" not in st.session_state:
     st.session_state.bm25 = BM25.load(config["BM25"]["output_path"])
 
 if "data" not in st.session_state:
-    with open(config["TextProcessor"]["output_path"]) as file:
-        st.session_state.data = [json.loads(line) for line in file]
+    st.session_state.data = read_records(config["TextProcessor"]["output_path"], columns=POST_COLUMNS)
 data = st.session_state.data
 
 # Streamlit UI layout
@@ -1,4 +1,3 @@
-import json
 from pathlib import Path
 
 import streamlit as st
@@ -8,7 +7,8 @@ import yaml
 from yadbil.data.processing.text.processing import TextProcessor
 from yadbil.pipeline.config import PipelineConfig
 from yadbil.search.fasttext import FastTextWrapper
-from yadbil.ui.utils.st_utils import tg_html
+from yadbil.ui.utils.st_utils import POST_COLUMNS, tg_html
+from yadbil.utils.data_handling import read_records
 
 
 # TODO: rework this mess with session state
@@ -35,11 +35,11 @@ if "ft" not in st.session_state:
             "emb_model_path", config["FastTextWrapper"]["output_path"] + "/model.kv"
         ),
         data_path=config["FastTextWrapper"]["output_path"] + "/emb_table.npy",
+        storage_params=config["FastTextWrapper"].get("storage_params"),
     )
 
 if "data" not in st.session_state:
-    with open(config["TextProcessor"]["output_path"]) as file:
-        st.session_state.data = [json.loads(line) for line in file]
+    st.session_state.data = read_records(config["TextProcessor"]["output_path"], columns=POST_COLUMNS)
 data = st.session_state.data
 
 # Streamlit UI layout
@@ -1,9 +1,9 @@
 import streamlit as st
 import streamlit.components.v1 as components
 
-from yadbil.graph import find_similar_posts_pagerank
-from yadbil.graph.io import load_resources
-from yadbil.utils.st_utils import tg_html
+from yadbil.recsys.graph import PageRankRecommender
+from yadbil.recsys.graph.io import load_resources
+from yadbil.ui.utils.st_utils import tg_html
 
 
 # Configuration Parameters
@@ -17,7 +17,14 @@ DEFAULT_NUM_RECOMMENDATIONS = 5
 MAX_NUM_RECOMMENDATIONS = 20
 
 
-G, posts, posts_view = load_resources(GRAPH_FILE_PATH, POSTS_FILE_PATH, POSTS_VIEW_FILE_PATH)
+@st.cache_resource
+def load_recommender(graph_path: str, posts_path: str, posts_view_path: str):
+    G, posts, posts_view = load_resources(graph_path, posts_path, posts_view_path)
+    # transition matrix is built once and shared between reruns
+    return G, posts, posts_view, PageRankRecommender(G)
+
+
+G, posts, posts_view, recommender = load_recommender(GRAPH_FILE_PATH, POSTS_FILE_PATH, POSTS_VIEW_FILE_PATH)
 
 # Streamlit UI layout
 st.title("Post Recommendation System")
@@ -43,7 +50,7 @@ with st.sidebar:
 
 # Main area for output
 if button:
-    similar_posts = find_similar_posts_pagerank(G, str(post_id), top_n)
+    similar_posts = recommender.recommend(str(post_id), top_n)
 
     if similar_posts:
         for post_id, score in similar_posts:
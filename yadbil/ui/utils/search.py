@@ -1,4 +1,3 @@
-import json
 from dataclasses import dataclass, field
 
 import streamlit as st
@@ -7,6 +6,8 @@ import yaml
 from yadbil.data.processing.text.processing import TextProcessor
 from yadbil.pipeline.config import PipelineConfig
 from yadbil.pipeline.utils import STEPS_MAPPING
+from yadbil.ui.utils.st_utils import POST_COLUMNS
+from yadbil.utils.data_handling import read_records
 
 
 @st.cache_data
@@ -23,8 +24,7 @@ def load_configs(path: str = "configs/ui.yml") -> tuple[dict, PipelineConfig]:
 # but maybe copy takes too long, idk
 @st.cache_resource
 def load_data(path: str) -> list:
-    with open(path) as file:
-        return [json.loads(line) for line in file]
+    return read_records(path, columns=POST_COLUMNS)
 
 
 @st.cache_data
@@ -37,6 +37,7 @@ def load_embeddings(config: dict, emb_name: str):
     return STEPS_MAPPING[emb_name].load(
         pretrained_emb_model_path=config.get("emb_model_path", config["output_path"] + "/model.kv"),
         data_path=config["output_path"] + "/emb_table.npy",
+        storage_params=config.get("storage_params"),
     )
 
 
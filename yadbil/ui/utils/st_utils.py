@@ -2,6 +2,10 @@ import streamlit as st
 import streamlit.components.v1 as components
 
 
+# post fields shown by the search pages, columnar data is read only for these
+POST_COLUMNS = ("id", "channel", "orig_text")
+
+
 # TODO: make height based on data length
 def tg_html(channel_id, post_id):
     telegram_html = (
@@ -0,0 +1,331 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from yadbil.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+SCHEMA_FILE = "_schema.json"
+COLUMNAR_SUFFIX = ".cols"
+FORMAT_NAME = "yadbil-columnar"
+
+KeyList = Union[str, Sequence[str]]
+
+
+def is_columnar(path: Union[str, Path, None]) -> bool:
+    return path is not None and (Path(path) / SCHEMA_FILE).is_file()
+
+
+def _column_files(path: Path, name: str) -> Tuple[Path, Path]:
+    return path / f"{name}.data", path / f"{name}.offsets.npy"
+
+
+def _mask_file(path: Path, name: str) -> Path:
+    # bool per row, saved only for optional columns (key absent in some records)
+    return path / f"{name}.present.npy"
+
+
+def _write_schema(path: Path, n_rows: int, columns: Dict[str, str], optional: Iterable[str]) -> None:
+    schema = {"format": FORMAT_NAME, "n_rows": n_rows, "columns": columns, "optional": sorted(optional)}
+    with open(path / SCHEMA_FILE, "w") as f:
+        json.dump(schema, f, indent=4)
+
+
+class ColumnarWriter:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        flatten: Sequence[str] = ("processed_text",),
+        base: Union[str, Path] = None,
+        flush_every: int = 10_000,
+    ):
+        """
+        Writes records column by column into a directory, memory is bounded by flush_every rows.
+
+        Every column is a file of JSON values, one per line, and an int64 array of line offsets,
+        so a reader can load a single column (projection) or slice rows without touching the others.
+        Columns missing from some records also get a presence mask, so absent keys are not read back as nulls.
+        The directory is written next to the target and renamed into place on close.
+
+        Args:
+            path (Union[str, Path]): Output directory.
+            flatten (Sequence[str]): Top level keys with dict values stored as one column per sub-key,
+                e.g. processed_text.words and processed_text.stemmed_words.
+            base (Union[str, Path]): Existing dataset to extend, its columns are copied and written records
+                must contain only new columns for the same rows.
+            flush_every (int): Rows buffered in memory before they are appended to the column files.
+        """
+        self.path = Path(path)
+        self.flatten = set(flatten)
+        self.flush_every = flush_every
+        self._tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        if self._tmp_path.exists():
+            shutil.rmtree(self._tmp_path)
+
+        self.n_rows = 0
+        self.columns: Dict[str, str] = {}
+        self.optional = set()
+        self._base_rows = None
+        if base is not None:
+            base = ColumnarDataset(base)
+            shutil.copytree(base.path, self._tmp_path)
+            self.columns = dict(base.columns)
+            self.optional = set(base.optional)
+            self._base_rows = base.n_rows
+        self._tmp_path.mkdir(parents=True, exist_ok=True)
+
+        # column -> encoded values since the last flush, bytes written and line offsets of flushed chunks
+        self._values: Dict[str, List[bytes]] = {}
+        self._written: Dict[str, int] = {}
+        self._offsets: Dict[str, List[np.ndarray]] = {}
+        # presence of the key per buffered row and per flushed chunk
+        self._present: Dict[str, List[bool]] = {}
+        self._masks: Dict[str, List[np.ndarray]] = {}
+        self._buffered = 0
+
+    def _flat_items(self, record: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        for key, value in record.items():
+            # an empty dict has no sub-keys to keep it, it is stored as a value
+            if key in self.flatten and isinstance(value, dict) and value:
+                for sub_key, sub_value in value.items():
+                    yield f"{key}.{sub_key}", sub_value
+            else:
+                yield key, value
+
+    def _add_column(self, name: str) -> None:
+        if name in self.columns and name not in self._values:
+            raise ValueError(f"Column {name} already exists in the base dataset")
+        self.columns[name] = "json"
+        # rows written before the column first appeared are nulls
+        self._values[name] = [b"null\n"] * self._buffered
+        self._present[name] = [False] * self._buffered
+        self._written[name] = 0
+        self._offsets[name] = []
+        self._masks[name] = []
+        if self.n_rows:
+            self._masks[name].append(np.zeros(self.n_rows, dtype=bool))
+            self._offsets[name].append(np.arange(self.n_rows, dtype=np.int64) * 5)
+            self._written[name] = 5 * self.n_rows
+            with open(_column_files(self._tmp_path, name)[0], "wb") as f:
+                f.write(b"null\n" * self.n_rows)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        row = dict(self._flat_items(record))
+        for name in row:
+            if name not in self._values:
+                self._add_column(name)
+        for name, values in self._values.items():
+            values.append((json.dumps(row.get(name), ensure_ascii=False) + "\n").encode("utf-8"))
+            self._present[name].append(name in row)
+        self._buffered += 1
+        if self._buffered >= self.flush_every:
+            self._flush()
+
+    def _flush(self) -> None:
+        for name, values in self._values.items():
+            lengths = np.fromiter((len(value) for value in values), dtype=np.int64, count=len(values))
+            offsets = np.empty(len(values), dtype=np.int64)
+            offsets[0:1] = 0
+            np.cumsum(lengths[:-1], out=offsets[1:])
+            self._offsets[name].append(offsets + self._written[name])
+            self._written[name] += int(lengths.sum())
+            with open(_column_files(self._tmp_path, name)[0], "ab") as f:
+                f.write(b"".join(values))
+            values.clear()
+            self._masks[name].append(np.array(self._present[name], dtype=bool))
+            self._present[name].clear()
+        self.n_rows += self._buffered
+        self._buffered = 0
+
+    def close(self) -> None:
+        self._flush()
+        if self._base_rows is not None and self._values and self.n_rows != self._base_rows:
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+            raise ValueError(f"Wrote {self.n_rows} rows of new columns to a dataset with {self._base_rows} rows")
+        if self._base_rows is not None:
+            self.n_rows = self._base_rows
+        for name in self._values:
+            offsets = np.concatenate(self._offsets[name] + [np.array([self._written[name]], dtype=np.int64)])
+            np.save(_column_files(self._tmp_path, name)[1], offsets)
+            mask = np.concatenate(self._masks[name]) if self._masks[name] else np.zeros(0, dtype=bool)
+            if not mask.all():
+                np.save(_mask_file(self._tmp_path, name), mask)
+                self.optional.add(name)
+        _write_schema(self._tmp_path, self.n_rows, self.columns, self.optional)
+
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        os.rename(self._tmp_path, self.path)
+        logger.info(f"Saved {self.n_rows} rows, {len(self.columns)} columns to {self.path}")
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+class ColumnarDataset:
+    def __init__(self, path: Union[str, Path]):
+        """
+        Read side of ColumnarWriter, columns are loaded on demand.
+
+        Args:
+            path (Union[str, Path]): Dataset directory.
+        """
+        self.path = Path(path)
+        with open(self.path / SCHEMA_FILE) as f:
+            schema = json.load(f)
+        self.n_rows: int = schema["n_rows"]
+        self.columns: Dict[str, str] = schema["columns"]
+        # columns with a presence mask, datasets written before masks have none
+        self.optional: List[str] = schema.get("optional", [])
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def resolve(self, keys: KeyList) -> Tuple[str, List[str]]:
+        """Longest column prefix of a key path and the keys left to look up inside its values."""
+        keys = keys.split(".") if isinstance(keys, str) else list(keys)
+        for i in range(len(keys), 0, -1):
+            name = ".".join(keys[:i])
+            if name in self.columns:
+                return name, keys[i:]
+        raise KeyError(f"No column for {keys} in {self.path}")
+
+    def read_column(self, name: str) -> List[Any]:
+        """All values of a stored column, parsed with a single json.loads call."""
+        data_path, _ = _column_files(self.path, name)
+        if not self.n_rows:
+            return []
+        data = data_path.read_bytes()
+        # values are one JSON document per line without raw newlines inside
+        return json.loads(b"[" + data[:-1].replace(b"\n", b",") + b"]")
+
+    def presence(self, name: str) -> Optional[np.ndarray]:
+        """Bool mask of rows that have the column key, None if every row has it."""
+        if name not in self.optional:
+            return None
+        return np.load(_mask_file(self.path, name))
+
+    def column(self, keys: KeyList) -> List[Any]:
+        """Values of a possibly nested field, only the files of its column are read. Absent keys are None."""
+        name, rest = self.resolve(keys)
+        values = self.read_column(name)
+        if rest:
+            values = [_get_nested(value, rest) for value in values]
+        return values
+
+    def records(self, columns: Optional[Sequence[KeyList]] = None) -> List[Dict[str, Any]]:
+        """
+        Records as nested dicts (flattened columns are nested back).
+
+        Args:
+            columns (Optional[Sequence[KeyList]]): Fields to read, all columns by default.
+        """
+        if columns is None:
+            names = list(self.columns)
+        else:
+            names = list(dict.fromkeys(self.resolve(keys)[0] for keys in columns))
+        records = [{} for _ in range(self.n_rows)]
+        for name in names:
+            *parents, leaf = name.split(".")
+            values = self.read_column(name)
+            present = self.presence(name)
+            rows = range(self.n_rows) if present is None else np.flatnonzero(present).tolist()
+            for row in rows:
+                record = records[row]
+                for parent in parents:
+                    record = record.setdefault(parent, {})
+                record[leaf] = values[row]
+        return records
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """All records as nested dicts, column files are streamed line by line instead of loaded."""
+        key_paths = [name.split(".") for name in self.columns]
+        masks = [self.presence(name) for name in self.columns]
+        handles = [open(_column_files(self.path, name)[0], "rb") for name in self.columns]
+        try:
+            for row in range(self.n_rows):
+                record = {}
+                for (*parents, leaf), mask, handle in zip(key_paths, masks, handles):
+                    line = handle.readline()
+                    if mask is not None and not mask[row]:
+                        continue
+                    target = record
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[leaf] = json.loads(line)
+                yield record
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def take(self, rows: Sequence[int], path: Union[str, Path], chunk_size: int = 65_536) -> "ColumnarDataset":
+        """Write a dataset with the given rows of every column, values are copied as bytes."""
+        rows = np.asarray(rows, dtype=np.int64)
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+        for name in self.columns:
+            data_path, offsets_path = _column_files(self.path, name)
+            offsets = np.load(offsets_path)
+            data = np.memmap(data_path, dtype=np.uint8, mode="r") if offsets[-1] else np.zeros(0, dtype=np.uint8)
+            lengths = offsets[rows + 1] - offsets[rows]
+            new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_offsets[1:])
+            new_data_path, new_offsets_path = _column_files(tmp_path, name)
+            with open(new_data_path, "wb") as f:
+                # byte positions are gathered in chunks of rows to bound memory
+                for start in range(0, len(rows), chunk_size):
+                    chunk = slice(start, start + chunk_size)
+                    chunk_lengths = lengths[chunk]
+                    chunk_offsets = np.concatenate(([0], np.cumsum(chunk_lengths)[:-1]))
+                    positions = np.repeat(offsets[rows[chunk]] - chunk_offsets, chunk_lengths)
+                    positions += np.arange(len(positions))
+                    f.write(np.asarray(data[positions]).tobytes())
+            np.save(new_offsets_path, new_offsets)
+            if name in self.optional:
+                np.save(_mask_file(tmp_path, name), self.presence(name)[rows])
+        _write_schema(tmp_path, len(rows), self.columns, self.optional)
+        if path.exists():
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+        return ColumnarDataset(path)
+
+
+def _get_nested(value: Any, keys: Sequence[str]) -> Any:
+    for key in keys:
+        value = value[key]
+    return value
+
+
+def jsonl_to_columnar(
+    jsonl_path: Union[str, Path],
+    path: Union[str, Path],
+    flatten: Sequence[str] = ("processed_text",),
+) -> ColumnarDataset:
+    """Import a JSONL file, records are streamed."""
+    with open(jsonl_path) as f, ColumnarWriter(path, flatten=flatten) as writer:
+        for line in f:
+            writer.write(json.loads(line))
+    return ColumnarDataset(path)
+
+
+def columnar_to_jsonl(path: Union[str, Path], jsonl_path: Union[str, Path]) -> None:
+    """Export a dataset to JSONL, records are streamed."""
+    with open(jsonl_path, "w") as f:
+        for record in ColumnarDataset(path).iter_records():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
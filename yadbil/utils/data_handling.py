@@ -1,5 +1,8 @@
 import json
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from yadbil.utils.columnar import ColumnarDataset, KeyList, is_columnar
 
 
 # TODO: I must rework this
@@ -23,7 +26,24 @@ class JsonCorpus:
         if self.data:
             for record in self.data:
                 yield get_dict_field(record, self.record_processed_data_key_list)
+        elif self.path and is_columnar(self.path):
+            # only the column of the field is read
+            yield from ColumnarDataset(self.path).column(self.record_processed_data_key_list)
         elif self.path:
             with open(self.path, "r") as f:
                 for line in f:
                     yield get_dict_field(json.loads(line), self.record_processed_data_key_list)
+
+
+def read_records(path: Union[str, Path], columns: Optional[Sequence[KeyList]] = None) -> List[Dict[str, Any]]:
+    """Load records of a JSONL file or a columnar dataset.
+
+    Args:
+        path: JSONL file or columnar dataset directory.
+        columns: Fields the caller needs, e.g. [["processed_text", "words"], "uid"]. Columnar datasets
+            read only these columns, JSONL records are always loaded whole.
+    """
+    if is_columnar(path):
+        return ColumnarDataset(path).records(columns)
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f]
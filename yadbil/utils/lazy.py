@@ -0,0 +1,77 @@
+import importlib
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Mapping
+
+
+def lazy_getattr(package: str, attrs: Dict[str, str], groups: Dict[str, List[str]] = None) -> Callable[[str], Any]:
+    """
+    Module level __getattr__ (PEP 562) importing attributes of a package from their modules on first access.
+
+    Args:
+        package (str): __name__ of the package.
+        attrs (Dict[str, str]): Attribute name -> module it is defined in.
+        groups (Dict[str, List[str]]): Name -> list of attribute names, e.g. SEARCH_STEPS.
+
+    Returns:
+        Callable[[str], Any]: Function to assign to __getattr__ of the package.
+    """
+    groups = groups or {}
+
+    def __getattr__(name: str) -> Any:
+        if name in attrs:
+            value = getattr(importlib.import_module(attrs[name]), name)
+        elif name in groups:
+            value = [__getattr__(attr) for attr in groups[name]]
+        else:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        # the next access does not reach __getattr__
+        setattr(sys.modules[package], name, value)
+        return value
+
+    # names of a group without importing them, see LazyRegistry.from_groups
+    __getattr__.groups = groups
+    return __getattr__
+
+
+class LazyRegistry(Mapping):
+    def __init__(self, paths: Dict[str, str]):
+        """
+        Read-only mapping of names to classes, a class module is imported on the first lookup.
+
+        Membership checks and iteration use only the names, so listing or validating
+        steps of a config does not import anything.
+
+        Args:
+            paths (Dict[str, str]): Name -> "package.module:ClassName" or "package.module" if the class has the name.
+        """
+        self.paths = paths
+        self._loaded: Dict[str, Any] = {}
+
+    @classmethod
+    def from_groups(cls, groups: Dict[str, str]) -> "LazyRegistry":
+        """
+        Registry of the names in lazy_getattr groups of packages, e.g. {"yadbil.search": "SEARCH_STEPS"}.
+
+        Only the package __init__s are imported, names are resolved through their lazy __getattr__,
+        so the package is the single place that knows the module of a name.
+        """
+        paths = {}
+        for package, group in groups.items():
+            for name in importlib.import_module(package).__getattr__.groups[group]:
+                paths[name] = f"{package}:{name}"
+        return cls(paths)
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._loaded:
+            module, _, attr = self.paths[name].partition(":")
+            self._loaded[name] = getattr(importlib.import_module(module), attr or name)
+        return self._loaded[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)